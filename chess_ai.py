@@ -1,6 +1,12 @@
 import time
 import random
+import signal
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
 import chess_mcts
+import chess_transposition
+import chess_time_manager
 import chess_constants as k
 
 
@@ -9,35 +15,60 @@ class ChessAI:
        Minimax search algorithms
        and the evaluation function.
     """
-    def __init__(self, depth):
+    def __init__(self, depth, transposition_table=None):
         self.DEPTH = depth
         self.depth_score = 0
         self.candidate_moves = []
         self.next_move = None
         self.global_score = 0
         self.counter = 0
+        self.quiescence_counter = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.killer_moves = []
+        self.history = [[0] * 4096, [0] * 4096]
         self.timeout = False
         self.start = 0
         self.global_best_move = None
+        self.completed_depth = 0
         self.bishop_pair = [None, None]
         self.doubled_pawns = [None, None]
         self.agent_data = []
+        # the Lazy SMP workers search on a table in shared memory
+        if transposition_table is None:
+            transposition_table = chess_transposition.TranspositionTable(k.transposition_table_mb)
+        self.transposition_table = transposition_table
+        # worker pool and shared transposition table of the Lazy SMP search (kept for the whole game)
+        self.smp_pool = None
+        self.smp_workers = 0
+        self.smp_finalizer = None
+        self.time_manager = chess_time_manager.TimeManager(k.clock_base, k.clock_increment)
         self.algorithm_functions = {'negamax_pruning': self.find_best_move_nega_max_alpha_beta,
                                     'minimax': self.find_best_move_minimax,
                                     'negamax_pruning_id_t_2': self.find_best_move_nega_max_alpha_beta_id,
                                     'negamax_pruning_id_t_5': self.find_best_move_nega_max_alpha_beta_id,
                                     'negamax_pruning_id_t_10': self.find_best_move_nega_max_alpha_beta_id,
+                                    'negamax_pruning_id_clock': self.find_best_move_nega_max_alpha_beta_id,
+                                    'negamax_pruning_id_smp_t_5': self.find_best_move_lazy_smp,
                                     'mcts': chess_mcts.find_best_move_mcts}
 
-    def append_to_log(self):
+    def append_to_log(self, state):
         """Adds move-search computations
            to a list that will be found
            in a csv file
+
+           Keyword arguments:
+           state -- information about chess game
         """
-        append_data = [self.next_move.get_chess_notation(),
+        append_data = [self.next_move.get_chess_notation(state),
                        self.counter,
+                       self.quiescence_counter,
+                       str("{:.1f}".format(100 * self.first_move_cutoffs / max(1, self.cutoffs))),
                        str("{:.3f}".format(self.depth_score)),
-                       round((time.time() - self.start), 2)]
+                       round((time.time() - self.start), 2),
+                       self.transposition_table.hits,
+                       self.transposition_table.stores,
+                       self.transposition_table.collisions]
         print(append_data)
         self.agent_data.append(append_data)
 
@@ -53,11 +84,14 @@ class ChessAI:
         random.shuffle(valid_moves)
         self.candidate_moves = []
         self.counter = 0
+        self.quiescence_counter = 0
+        self.transposition_table.new_search()
+        self.reset_move_ordering()
         self.start = time.time()
         self.find_move_nega_max_alpha_beta(state, valid_moves, self.DEPTH, -k.CHECKMATE,
                                            k.CHECKMATE, 1 if state.white_moves else -1)
         if self.next_move is not None:
-            self.append_to_log()
+            self.append_to_log(state)
         return self.next_move
 
     def find_best_move_minimax(self, state, valid_moves):
@@ -72,124 +106,562 @@ class ChessAI:
         random.shuffle(valid_moves)
         self.candidate_moves = []
         self.counter = 0
+        self.quiescence_counter = 0
+        self.transposition_table.new_search()
         self.start = time.time()
         self.find_move_minimax(state, valid_moves, self.DEPTH, True if state.white_moves else False)
         if self.next_move is not None:
-            self.append_to_log()
+            self.append_to_log(state)
         return self.next_move
 
-    def find_best_move_nega_max_alpha_beta_id(self, state, valid_moves):
+    def find_best_move_nega_max_alpha_beta_id(self, state, valid_moves, first_depth=1, log=True):
         """Returns the best move after
            negamax iterative deepening
            algorithm call (with timeout)
-           If time runs out, the last
-           calculated best move will
-           be returned (2s, 5s or 10s)
+           Every iteration searches the best move
+           of the previous one first and the inner
+           nodes reuse the transposition table
+           The window of an iteration is centred on
+           the previous score (aspiration window) and
+           widened on the failing side if the score
+           falls out of it
+           If time runs out, the best fully searched
+           move will be returned (2s, 5s or 10s, or
+           the time allocated from the game clock)
+           No iteration starts if it isn't expected to
+           end in time and an iteration that changes
+           the best move extends the search time
 
            Keyword arguments:
            state       -- information about chess game
            valid_moves -- list containing possible moves
+           first_depth -- depth of the first iteration
+           log         -- whether the search is added to the log
         """
-        self.next_move = None
         random.shuffle(valid_moves)
-        self.candidate_moves = []
         self.counter = 0
-        self.DEPTH = 2
+        self.quiescence_counter = 0
+        self.global_best_move = None
+        self.global_score = 0
+        self.completed_depth = 0
         self.timeout = False
+        self.transposition_table.new_search()
+        self.reset_move_ordering()
         self.start = time.time()
-        for depth in range(0, k.MAX_DEPTH):
-            self.global_best_move = self.next_move
-            self.global_score = self.depth_score
-            self.DEPTH = 2 + depth
-            self.find_move_nega_max_alpha_beta_id(state, valid_moves, self.DEPTH, -k.CHECKMATE,
-                                                  k.CHECKMATE, 1 if state.white_moves else -1)
+        self.time_manager.start_search(state.white_moves, k.timeout)
+        candidate_moves = []
+        score = 0
+        for depth in range(first_depth, k.MAX_DEPTH + 1):
+            if not self.time_manager.start_iteration():
+                break
+            previous_best_move = self.global_best_move
+            # the other root moves keep their order, the inner nodes are ordered by the transposition table
+            if self.global_best_move is not None:
+                valid_moves.remove(self.global_best_move)
+                valid_moves.insert(0, self.global_best_move)
+            self.DEPTH = depth
+            window = k.aspiration_window
+            # the scores of the first iterations are too unstable for a narrow window
+            if depth > 2 and window:
+                alpha, beta = max(score - window, -k.CHECKMATE), min(score + window, k.CHECKMATE)
+            else:
+                alpha, beta = -k.CHECKMATE, k.CHECKMATE
+            while True:
+                self.next_move = None
+                self.candidate_moves = []
+                score = self.find_move_nega_max_alpha_beta_id(state, valid_moves, self.DEPTH, alpha, beta,
+                                                              1 if state.white_moves else -1)
+                if self.timeout:
+                    break
+                window *= 2
+                if score <= alpha and alpha > -k.CHECKMATE:
+                    alpha = max(score - window, -k.CHECKMATE)
+                elif score >= beta and beta < k.CHECKMATE:
+                    # the move that failed high is already better than the previous best move
+                    self.global_best_move = self.next_move
+                    self.global_score = self.depth_score
+                    beta = min(score + window, k.CHECKMATE)
+                else:
+                    break
+            # only fully searched root moves set the next move, the previous best move is searched first
+            # so a move found by an interrupted iteration is at least as good as it
+            if self.next_move is not None:
+                self.global_best_move = self.next_move
+                self.global_score = self.depth_score
+                candidate_moves = self.candidate_moves
             if self.timeout:
-                if self.global_best_move is not None:
-                    self.append_to_log()
-                return self.global_best_move
+                break
+            self.completed_depth = depth
+            self.time_manager.end_iteration(previous_best_move is not None and
+                                            self.global_best_move != previous_best_move)
+
+        self.time_manager.stop_search(state.white_moves)
+        self.next_move = self.global_best_move
+        self.depth_score = self.global_score
+        self.candidate_moves = candidate_moves
+        if log and self.next_move is not None:
+            self.append_to_log(state)
+        return self.next_move
+
+    def find_best_move_lazy_smp(self, state, valid_moves):
+        """Returns the best move after the
+           iterative deepening search of k.smp_workers
+           processes (Lazy SMP): they share the
+           transposition table, so every worker
+           profits from the positions searched by
+           the others, and search the same root with
+           different move orders (half of them skip
+           the first iteration), so they don't search
+           the same positions at the same time
+           The move of the worker that completed the
+           deepest iteration is returned
+           The workers and the shared table are kept
+           until stop_lazy_smp (end of the game)
 
-    def find_move_nega_max_alpha_beta(self, state, valid_moves, depth, alpha, beta, turn_polarity):
+           Keyword arguments:
+           state       -- information about chess game
+           valid_moves -- list containing possible moves
+        """
+        self.start_lazy_smp()
+        self.start = time.time()
+        self.time_manager.start_search(state.white_moves, k.timeout)
+        snapshot = state.get_snapshot()
+        results = self.smp_pool.starmap(search_worker, [(worker, type(state), snapshot, self.time_manager.soft_limit)
+                                                        for worker in range(k.smp_workers)])
+        self.time_manager.stop_search(state.white_moves)
+
+        counters = [sum(worker_counters) for worker_counters in zip(*(result[4] for result in results))]
+        (self.counter, self.quiescence_counter, self.cutoffs, self.first_move_cutoffs, self.transposition_table.hits,
+         self.transposition_table.stores, self.transposition_table.collisions) = counters
+        # the first worker (full iterative deepening) wins ties
+        self.completed_depth, move_id, self.global_score, self.candidate_moves = \
+            max(results, key=lambda result: (result[0], result[1] is not None))[:4]
+        self.next_move = next((move for move in valid_moves if move.move_id == move_id), None)
+        self.depth_score = self.global_score
+        if self.next_move is not None:
+            self.append_to_log(state)
+        return self.next_move
+
+    def start_lazy_smp(self):
+        """Starts the k.smp_workers processes of the
+           Lazy SMP search and the shared table (nothing
+           is done if they are already running)
+        """
+        if self.smp_workers == k.smp_workers:
+            return
+        self.stop_lazy_smp()
+        self.smp_workers = k.smp_workers
+        table_memory = shared_memory.SharedMemory(
+            create=True, size=chess_transposition.get_table_size(k.transposition_table_mb))
+        self.smp_pool = multiprocessing.Pool(k.smp_workers, initializer=init_search_worker,
+                                             initargs=(table_memory.name,))
+        self.smp_finalizer = weakref.finalize(self, close_lazy_smp, self.smp_pool, table_memory)
+
+    def stop_lazy_smp(self):
+        """Stops the worker processes of the Lazy
+           SMP search and frees the shared table
+           (also done when the AI is garbage collected
+           or the application exits)
+        """
+        if self.smp_finalizer is not None:
+            self.smp_finalizer()
+        self.smp_pool = None
+        self.smp_workers = 0
+        self.smp_finalizer = None
+
+    def find_move_nega_max_alpha_beta(self, state, valid_moves, depth, alpha, beta, turn_polarity, ply=0,
+                                      allow_null_move=True):
         """Implementation of negamax
            alpha beta pruning algorithm
 
            Keyword arguments:
-           state         -- information about chess game
-           valid_moves   -- list containing possible moves
-           depth         -- the number of future states analyzed
-           alpha         -- (-inf initial value)
-           beta          -- (+inf initial value)
-           turn_polarity -- +1 for white player else -1
+           state           -- information about chess game
+           valid_moves     -- list containing possible moves
+           depth           -- the number of future states analyzed
+           alpha           -- (-inf initial value)
+           beta            -- (+inf initial value)
+           turn_polarity   -- +1 for white player else -1
+           ply             -- number of moves made since the root
+           allow_null_move -- False right after a null move
         """
         self.counter += 1
         if depth == 0:
+            if k.quiescence:
+                return self.quiescence_search(state, alpha, beta, turn_polarity)
             return turn_polarity * self.score_material(state)
 
+        alpha_original = alpha
+        entry = self.transposition_table.probe(state.zobrist_key)
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move_id = entry
+            # the root is always searched, it sets the next move
+            if entry_depth >= depth and depth != self.DEPTH:
+                if bound == k.EXACT:
+                    return entry_score
+                if bound == k.LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+            if hash_move_id:
+                valid_moves = self.get_hash_move_first(state, valid_moves, hash_move_id)
+
+        in_check = state.in_check()
+        if allow_null_move and self.null_move_allowed(state, depth, beta, in_check):
+            # the opponent moves twice: if the position is still too good, a real move surely is
+            state.make_null_move()
+            score = -self.find_move_nega_max_alpha_beta(state,
+                                                        self.get_next_moves(state, depth - k.null_move_reduction,
+                                                                            ply + 1),
+                                                        depth - 1 - k.null_move_reduction, -beta,
+                                                        -beta + k.null_window, -turn_polarity, ply + 1,
+                                                        allow_null_move=False)
+            state.undo_null_move()
+            if score >= beta:
+                return beta
+
         max_score = -k.CHECKMATE
-        for move in valid_moves:
+        best_move_id = 0
+        for move_count, move in enumerate(valid_moves, 1):
             draw_made = False
-            state.make_move(move)
+            state.make_move(move, search_mode=True)
             if state.draw_rule or state.stalemate:
                 draw_made = True
-            next_moves = state.get_valid_moves()
-            score = -self.find_move_nega_max_alpha_beta(state, next_moves, depth-1, -beta, -alpha, -turn_polarity)
+            score = None
+            if self.reduce_late_move(state, move, depth, ply, move_count, in_check):
+                # null window search at reduced depth, verified at full depth if the move raises alpha
+                reduced_depth = depth - k.late_move_reduction
+                score = -self.find_move_nega_max_alpha_beta(state, self.get_next_moves(state, reduced_depth, ply + 1),
+                                                            reduced_depth - 1, -alpha - k.null_window, -alpha,
+                                                            -turn_polarity, ply + 1)
+            if score is None or score > alpha:
+                score = -self.find_move_nega_max_alpha_beta(state, self.get_next_moves(state, depth, ply + 1),
+                                                            depth-1, -beta, -alpha, -turn_polarity, ply + 1)
             if score > max_score and not draw_made:
                 max_score = score
+                best_move_id = move.move_id
                 if depth == self.DEPTH:
                     self.next_move = move
                     self.depth_score = max_score * turn_polarity
-                    self.candidate_moves.append([move.get_chess_notation(),
+                    self.candidate_moves.append([move.get_chess_notation(state),
                                                  str("{:.3f}".format(score * turn_polarity))])
             state.undo_move()
             if max_score > alpha:
                 alpha = max_score
             if alpha >= beta:
+                self.update_move_ordering(state, move, depth, ply, move_count)
                 break
+        self.store_search_result(state, depth, alpha, alpha_original, beta, best_move_id)
         return alpha
 
-    def find_move_nega_max_alpha_beta_id(self, state, valid_moves, depth, alpha, beta, turn_polarity):
+    def find_move_nega_max_alpha_beta_id(self, state, valid_moves, depth, alpha, beta, turn_polarity, ply=0,
+                                         allow_null_move=True):
         """Implementation of negamax
            alpha beta pruning algorithm
            with iterative deepening
 
            Keyword arguments:
-           state         -- information about chess game
-           valid_moves   -- list containing possible moves
-           depth         -- the number of future states analyzed
-           alpha         -- (-inf initial value)
-           beta          -- (+inf initial value)
-           turn_polarity -- +1 for white player else -1
+           state           -- information about chess game
+           valid_moves     -- list containing possible moves
+           depth           -- the number of future states analyzed
+           alpha           -- (-inf initial value)
+           beta            -- (+inf initial value)
+           turn_polarity   -- +1 for white player else -1
+           ply             -- number of moves made since the root
+           allow_null_move -- False right after a null move
         """
-        if round((time.time() - self.start), 2) > k.timeout:
-            self.timeout = True
-            self.depth_score = alpha * turn_polarity
+        if self.hard_limit_polled():
             return alpha
 
         self.counter += 1
         if depth == 0:
+            if k.quiescence:
+                return self.quiescence_search(state, alpha, beta, turn_polarity, timed=True)
             return turn_polarity * self.score_material(state)
 
+        alpha_original = alpha
+        entry = self.transposition_table.probe(state.zobrist_key)
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move_id = entry
+            # the root is always searched, it sets the next move
+            if entry_depth >= depth and depth != self.DEPTH:
+                if bound == k.EXACT:
+                    return entry_score
+                if bound == k.LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+            if hash_move_id:
+                valid_moves = self.get_hash_move_first(state, valid_moves, hash_move_id)
+
+        in_check = state.in_check()
+        if allow_null_move and self.null_move_allowed(state, depth, beta, in_check):
+            # the opponent moves twice: if the position is still too good, a real move surely is
+            state.make_null_move()
+            score = -self.find_move_nega_max_alpha_beta_id(state,
+                                                           self.get_next_moves(state, depth - k.null_move_reduction,
+                                                                               ply + 1),
+                                                           depth - 1 - k.null_move_reduction, -beta,
+                                                           -beta + k.null_window, -turn_polarity, ply + 1,
+                                                           allow_null_move=False)
+            state.undo_null_move()
+            if self.timeout:
+                return alpha
+            if score >= beta:
+                return beta
+
         max_score = -k.CHECKMATE
-        for move in valid_moves:
+        best_move_id = 0
+        for move_count, move in enumerate(valid_moves, 1):
             draw_made = False
-            state.make_move(move)
+            state.make_move(move, search_mode=True)
             if state.draw_rule or state.stalemate:
                 draw_made = True
-            next_moves = state.get_valid_moves()
-            score = -self.find_move_nega_max_alpha_beta_id(state, next_moves, depth-1, -beta, -alpha, -turn_polarity)
+            score = None
+            if self.reduce_late_move(state, move, depth, ply, move_count, in_check):
+                # null window search at reduced depth, verified at full depth if the move raises alpha
+                reduced_depth = depth - k.late_move_reduction
+                score = -self.find_move_nega_max_alpha_beta_id(state,
+                                                               self.get_next_moves(state, reduced_depth, ply + 1),
+                                                               reduced_depth - 1, -alpha - k.null_window, -alpha,
+                                                               -turn_polarity, ply + 1)
+            if (score is None or score > alpha) and not self.timeout:
+                if move_count == 1 or not k.principal_variation_search:
+                    score = -self.find_move_nega_max_alpha_beta_id(state, self.get_next_moves(state, depth, ply + 1),
+                                                                   depth-1, -beta, -alpha, -turn_polarity, ply + 1)
+                else:
+                    # null window: only proves that the move is not better than the best move so far
+                    score = -self.find_move_nega_max_alpha_beta_id(state, self.get_next_moves(state, depth, ply + 1),
+                                                                   depth-1, -alpha - k.null_window, -alpha,
+                                                                   -turn_polarity, ply + 1)
+                    if alpha < score < beta and not self.timeout:
+                        score = -self.find_move_nega_max_alpha_beta_id(state,
+                                                                       self.get_next_moves(state, depth, ply + 1),
+                                                                       depth-1, -beta, -alpha, -turn_polarity, ply + 1)
+            if self.timeout:
+                # the score of an interrupted search is discarded
+                state.undo_move()
+                return alpha
             if score > max_score and not draw_made:
                 max_score = score
-                if depth == self.DEPTH:
+                best_move_id = move.move_id
+                # a root move failing low on the aspiration window isn't known to be the best
+                if depth == self.DEPTH and score > alpha:
                     self.next_move = move
                     self.depth_score = max_score * turn_polarity
-                    self.candidate_moves.append([move.get_chess_notation(),
+                    self.candidate_moves.append([move.get_chess_notation(state),
                                                  str("{:.3f}".format(score * turn_polarity))])
             state.undo_move()
             if max_score > alpha:
                 alpha = max_score
             if alpha >= beta:
+                self.update_move_ordering(state, move, depth, ply, move_count)
                 break
+        self.store_search_result(state, depth, alpha, alpha_original, beta, best_move_id)
         return alpha
 
+    def hard_limit_polled(self):
+        """Return true if the timed search has to be
+           interrupted (sets the timeout flag): the clock
+           is read every k.time_poll_nodes nodes, negamax
+           and quiescence nodes alike, and the first
+           iteration is always completed so there is
+           a move to play
+        """
+        if self.DEPTH > 1 and (self.counter + self.quiescence_counter) % k.time_poll_nodes == 0 and \
+                self.time_manager.hard_limit_reached():
+            self.timeout = True
+        return self.timeout
+
+    def null_move_allowed(self, state, depth, beta, in_check):
+        """Return true if the node may be pruned
+           by a null move search (not at the root, in
+           check or without pieces besides the king
+           and the pawns, where zugzwang is common)
+
+           Keyword arguments:
+           state    -- information about chess game
+           depth    -- the number of future states analyzed
+           beta     -- upper limit of the search window
+           in_check -- True if the player to move is in check
+        """
+        return k.null_move_pruning and depth > k.null_move_reduction and depth != self.DEPTH and \
+            beta < k.CHECKMATE and not in_check and state.has_non_pawn_material()
+
+    def reduce_late_move(self, state, move, depth, ply, move_count, in_check):
+        """Return true if the move (just made) is
+           searched at reduced depth: a quiet move
+           ordered late, that is neither a killer
+           move nor a check
+
+           Keyword arguments:
+           state      -- information about chess game (after the move)
+           move       -- Move object (start row, start col, end row, end col)
+           depth      -- the number of future states analyzed (before the move)
+           ply        -- number of moves made since the root (before the move)
+           move_count -- number of moves searched in the node (this move included)
+           in_check   -- True if the player that made the move was in check
+        """
+        return k.late_move_reductions and move_count > k.late_move_threshold and \
+            depth >= k.late_move_min_depth and depth != self.DEPTH and not in_check and \
+            move.place_to_go == k.empty and not move.is_pawn_promotion and \
+            move not in self.killer_moves[ply] and not state.in_check()
+
+    def get_next_moves(self, state, depth, ply):
+        """Returns the moves of the position reached
+           by the last move (list or generator)
+
+           Keyword arguments:
+           state -- information about chess game
+           depth -- the number of future states analyzed (before the last move)
+           ply   -- number of moves made since the root (after the last move)
+        """
+        # leaves need the full list (checkmate / stalemate flags) unless the quiescence search
+        # looks for the mates, inner nodes generate lazily
+        if depth == 1 and not k.quiescence:
+            return state.get_valid_moves()
+        return state.get_staged_moves(self.killer_moves[ply], self.get_history(state))
+
+    def quiescence_search(self, state, alpha, beta, turn_polarity, timed=False):
+        """Searches the captures (all the evasions
+           when in check) after the last ply, so that
+           the leaves aren't scored in the middle of
+           a capture sequence (the player may also
+           stop capturing and keep the static score)
+
+           Keyword arguments:
+           state         -- information about chess game
+           alpha         -- lower limit of the search window
+           beta          -- upper limit of the search window
+           turn_polarity -- +1 for white player else -1
+           timed         -- True if the search is interrupted at the hard limit
+        """
+        if timed and self.hard_limit_polled():
+            return alpha
+
+        self.quiescence_counter += 1
+        if state.checkmate or state.stalemate or state.draw_rule:
+            return turn_polarity * self.score_material(state)
+
+        if state.in_check():
+            moves = state.get_valid_moves()
+            if state.checkmate:
+                return turn_polarity * self.score_material(state)
+            stand_pat = None
+        else:
+            stand_pat = turn_polarity * self.score_material(state)
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            state.checked, state.pins, state.checks = state.king_helper()
+            # losing captures (static exchange evaluation) are pruned
+            moves = state.get_ordered_captures()[0]
+
+        for move in moves:
+            # delta pruning: even winning the captured piece can't raise alpha
+            if stand_pat is not None and not move.is_pawn_promotion and \
+                    stand_pat + k.piece_score[move.place_to_go[1]] + k.delta_margin < alpha:
+                continue
+            state.make_move(move, search_mode=True)
+            score = -self.quiescence_search(state, -beta, -alpha, -turn_polarity, timed)
+            state.undo_move()
+            if timed and self.timeout:
+                return alpha
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def reset_move_ordering(self):
+        """Clears the killer moves and the cutoff
+           counters before a new search (the history
+           scores of the previous searches are halved)
+        """
+        self.killer_moves = [[None, None] for _ in range(max(self.DEPTH, k.MAX_DEPTH) + 1)]
+        self.history = [[score // 2 for score in side_history] for side_history in self.history]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def get_history(self, state):
+        """Returns the history scores of the
+           player to move (indexed by move id)
+
+           Keyword arguments:
+           state -- information about chess game
+        """
+        return self.history[0 if state.white_moves else 1]
+
+    def update_move_ordering(self, state, move, depth, ply, move_count):
+        """Counts the beta cutoff and, for a quiet
+           move, stores it as a killer move of the
+           ply and raises its history score (deeper
+           cutoffs weigh more)
+
+           Keyword arguments:
+           state      -- information about chess game
+           move       -- move that caused the cutoff
+           depth      -- the number of future states analyzed
+           ply        -- number of moves made since the root
+           move_count -- number of moves searched in the node (cutoff move included)
+        """
+        self.cutoffs += 1
+        if move_count == 1:
+            self.first_move_cutoffs += 1
+        if move.place_to_go != k.empty or move.is_pawn_promotion:
+            return
+        if not move.castle_move:
+            killers = self.killer_moves[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.get_history(state)[move.move_id] += depth * depth
+
+    @staticmethod
+    def get_hash_move_first(state, valid_moves, move_id):
+        """Yields the best move stored in the
+           transposition table (if it is valid)
+           before the other moves
+
+           Keyword arguments:
+           state       -- information about chess game
+           valid_moves -- list or generator containing possible moves
+           move_id     -- id of the stored best move
+        """
+        if isinstance(valid_moves, list):
+            hash_move = next((move for move in valid_moves if move.move_id == move_id), None)
+        else:
+            hash_move = state.get_move_from_id(move_id)
+        if hash_move is not None:
+            yield hash_move
+        for move in valid_moves:
+            if move != hash_move:
+                yield move
+
+    def store_search_result(self, state, depth, score, alpha, beta, move_id):
+        """Stores the score of the position in the
+           transposition table with the bound type
+           given by the search window
+
+           Keyword arguments:
+           state   -- information about chess game
+           depth   -- the number of future states analyzed
+           score   -- returned score of the search
+           alpha   -- lower limit of the search window (before the table probe)
+           beta    -- upper limit of the search window
+           move_id -- id of the best move (0 if no move raised the score)
+        """
+        if score <= alpha:
+            bound = k.UPPER_BOUND
+        elif score >= beta:
+            bound = k.LOWER_BOUND
+        else:
+            bound = k.EXACT
+        self.transposition_table.store(state.zobrist_key, depth, score, bound, move_id)
+
     def find_move_minimax(self, state, valid_moves, depth, maximize):
         """Implementation of minimax
            algorithm
@@ -208,7 +680,7 @@ class ChessAI:
             max_score = -k.CHECKMATE
             for move in valid_moves:
                 draw_made = False
-                state.make_move(move)
+                state.make_move(move, search_mode=True)
                 if state.draw_rule or state.stalemate:
                     draw_made = True
                 next_moves = state.get_valid_moves()
@@ -218,7 +690,7 @@ class ChessAI:
                     if depth == self.DEPTH:
                         self.next_move = move
                         self.depth_score = max_score
-                        self.candidate_moves.append([move.get_chess_notation(),
+                        self.candidate_moves.append([move.get_chess_notation(state),
                                                     str("{:.3f}".format(score))])
                 state.undo_move()
             return max_score
@@ -226,7 +698,7 @@ class ChessAI:
             min_score = k.CHECKMATE
             for move in valid_moves:
                 draw_made = False
-                state.make_move(move)
+                state.make_move(move, search_mode=True)
                 if state.draw_rule or state.stalemate:
                     draw_made = True
                 next_moves = state.get_valid_moves()
@@ -236,7 +708,7 @@ class ChessAI:
                     if depth == self.DEPTH:
                         self.next_move = move
                         self.depth_score = min_score
-                        self.candidate_moves.append([move.get_chess_notation(),
+                        self.candidate_moves.append([move.get_chess_notation(state),
                                                     str("{:.3f}".format(score))])
                 state.undo_move()
             return min_score
@@ -288,3 +760,62 @@ class ChessAI:
             score += 2
 
         return score
+
+
+# search state of a Lazy SMP worker process (set by init_search_worker)
+worker_table_memory = None
+worker_ai = None
+
+
+def init_search_worker(table_name):
+    """Attaches a Lazy SMP worker process to the
+       shared transposition table (the worker keeps
+       its AI, so the table ages and the move ordering
+       carry over between the moves of the game)
+
+       Keyword arguments:
+       table_name -- name of the shared memory of the transposition table
+    """
+    global worker_table_memory, worker_ai
+    # the forked worker inherits the SIGTERM handler of SDL, Pool.terminate has to stop it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    worker_table_memory = shared_memory.SharedMemory(name=table_name)
+    worker_ai = ChessAI(1, chess_transposition.TranspositionTable(buffer=worker_table_memory.buf))
+
+
+def search_worker(worker, game_state, snapshot, timeout):
+    """Runs the iterative deepening search of a
+       Lazy SMP worker process and returns (completed
+       depth, best move id, score, candidate moves,
+       search counters)
+
+       Keyword arguments:
+       worker     -- number of the worker (0 for the full iterative deepening)
+       game_state -- engine backend class (GameState or BitboardGameState)
+       snapshot   -- tuple returned by get_snapshot
+       timeout    -- search time (s)
+    """
+    k.timeout = timeout
+    random.seed(worker)
+    state = game_state.from_snapshot(snapshot)
+    ai = worker_ai
+    move = ai.find_best_move_nega_max_alpha_beta_id(state, state.get_valid_moves(), first_depth=1 + worker % 2,
+                                                    log=False)
+    counters = (ai.counter, ai.quiescence_counter, ai.cutoffs, ai.first_move_cutoffs,
+                ai.transposition_table.hits, ai.transposition_table.stores, ai.transposition_table.collisions)
+    return (ai.completed_depth, None if move is None else move.move_id, ai.global_score, ai.candidate_moves,
+            counters)
+
+
+def close_lazy_smp(pool, table_memory):
+    """Stops the worker processes and frees
+       the shared transposition table
+
+       Keyword arguments:
+       pool         -- multiprocessing.Pool of the workers
+       table_memory -- shared memory of the transposition table
+    """
+    pool.close()
+    pool.join()
+    table_memory.close()
+    table_memory.unlink()
@@ -0,0 +1,278 @@
+import sys
+import time
+import pickle
+import tracemalloc
+import random
+import chess_engine
+import chess_bitboard
+import chess_ai
+import chess_constants as k
+
+"""Headless benchmarks for the chess engine
+   (run from the project folder, for example:
+   python chess_benchmark.py search)
+"""
+
+benchmark_positions = {
+    "Opening": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "Italian": "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5",
+    "Middlegame": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "Kiwipete": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+}
+
+
+def benchmark_search(depths=(3, 4)):
+    """Runs the negamax alpha beta search
+       on every benchmark position (with every
+       engine backend) and reports the searched
+       nodes per second
+
+       Keyword arguments:
+       depths -- search depths (k.depth values) to benchmark
+    """
+    for backend, game_state in chess_bitboard.game_state_backends.items():
+        for depth in depths:
+            total_nodes = 0
+            total_quiescence_nodes = 0
+            total_time = 0
+            for name, fen in benchmark_positions.items():
+                random.seed(0)
+                state = game_state.from_fen(fen)
+                ai = chess_ai.ChessAI(depth)
+                start = time.perf_counter()
+                ai.find_best_move_nega_max_alpha_beta(state, state.get_valid_moves())
+                elapsed = time.perf_counter() - start
+                total_nodes += ai.counter
+                total_quiescence_nodes += ai.quiescence_counter
+                total_time += elapsed
+                print(f"{backend:<8} | depth {depth} | {name:<12} | {ai.counter:>8} nodes | "
+                      f"{ai.quiescence_counter:>8} quiescence nodes | {elapsed:8.2f} s | "
+                      f"{(ai.counter + ai.quiescence_counter) / elapsed:10.0f} nodes/s")
+            print(f"{backend:<8} | depth {depth} | {'Total':<12} | {total_nodes:>8} nodes | "
+                  f"{total_quiescence_nodes:>8} quiescence nodes | {total_time:8.2f} s | "
+                  f"{(total_nodes + total_quiescence_nodes) / total_time:10.0f} nodes/s")
+
+
+def benchmark_iterative_deepening(depth=5):
+    """Reports the nodes searched by the iterative
+       deepening search up to a fixed depth (no
+       timeout) with full windows and with the
+       principal variation search and aspiration
+       windows
+
+       Keyword arguments:
+       depth -- last iteration of the search
+    """
+    settings = (k.timeout, k.MAX_DEPTH, k.principal_variation_search, k.aspiration_window)
+    k.timeout = float("inf")
+    k.MAX_DEPTH = depth
+    for name, principal_variation_search, aspiration_window in (("full", False, 0), ("pvs+asp", True, settings[3])):
+        k.principal_variation_search = principal_variation_search
+        k.aspiration_window = aspiration_window
+        total_nodes = 0
+        total_time = 0
+        for position, fen in benchmark_positions.items():
+            random.seed(0)
+            state = chess_engine.GameState.from_fen(fen)
+            ai = chess_ai.ChessAI(depth)
+            start = time.perf_counter()
+            move = ai.find_best_move_nega_max_alpha_beta_id(state, state.get_valid_moves())
+            elapsed = time.perf_counter() - start
+            nodes = ai.counter + ai.quiescence_counter
+            total_nodes += nodes
+            total_time += elapsed
+            print(f"{name:<7} | depth {depth} | {position:<12} | {move.get_chess_notation(state):<6} | "
+                  f"{ai.global_score:7.3f} | {nodes:>8} nodes | {elapsed:8.2f} s")
+        print(f"{name:<7} | depth {depth} | {'Total':<12} | {'':<6} | {'':<7} | {total_nodes:>8} nodes | "
+              f"{total_time:8.2f} s")
+    k.timeout, k.MAX_DEPTH, k.principal_variation_search, k.aspiration_window = settings
+
+
+def benchmark_pruning(timeout=5):
+    """Reports the depth completed by the iterative
+       deepening search in a fixed time with and
+       without the null move pruning and the late
+       move reductions
+
+       Keyword arguments:
+       timeout -- search time of every position (s)
+    """
+    settings = (k.timeout, k.null_move_pruning, k.late_move_reductions)
+    k.timeout = timeout
+    for name, null_move_pruning, late_move_reductions in (("none", False, False), ("null", True, False),
+                                                          ("lmr", False, True), ("null+lmr", True, True)):
+        k.null_move_pruning = null_move_pruning
+        k.late_move_reductions = late_move_reductions
+        total_depth = 0
+        total_nodes = 0
+        total_time = 0
+        for position, fen in benchmark_positions.items():
+            random.seed(0)
+            state = chess_engine.GameState.from_fen(fen)
+            ai = chess_ai.ChessAI(1)
+            start = time.perf_counter()
+            move = ai.find_best_move_nega_max_alpha_beta_id(state, state.get_valid_moves())
+            elapsed = time.perf_counter() - start
+            nodes = ai.counter + ai.quiescence_counter
+            total_depth += ai.completed_depth
+            total_nodes += nodes
+            total_time += elapsed
+            print(f"{name:<8} | {position:<12} | {move.get_chess_notation(state):<6} | "
+                  f"depth {ai.completed_depth:>2} | {nodes:>8} nodes | {elapsed:6.2f} s")
+        print(f"{name:<8} | {'Total':<12} | {'':<6} | depth {total_depth / len(benchmark_positions):4.1f} | "
+              f"{total_nodes:>8} nodes | {total_time:6.2f} s")
+    k.timeout, k.null_move_pruning, k.late_move_reductions = settings
+
+
+def benchmark_lazy_smp(timeout=5, worker_counts=(1, 2, 4, 8)):
+    """Reports the nodes per second (summed over
+       the workers) and the depth completed by the
+       Lazy SMP search with 1 to 8 worker processes
+
+       Keyword arguments:
+       timeout       -- search time of every position (s)
+       worker_counts -- numbers of worker processes to benchmark
+    """
+    settings = (k.timeout, k.smp_workers)
+    k.timeout = timeout
+    base_speed = None
+    for workers in worker_counts:
+        k.smp_workers = workers
+        total_depth = 0
+        total_nodes = 0
+        total_time = 0
+        # the workers are started once, so their startup isn't timed
+        ai = chess_ai.ChessAI(1)
+        ai.start_lazy_smp()
+        for position, fen in benchmark_positions.items():
+            state = chess_engine.GameState.from_fen(fen)
+            start = time.perf_counter()
+            move = ai.find_best_move_lazy_smp(state, state.get_valid_moves())
+            elapsed = time.perf_counter() - start
+            nodes = ai.counter + ai.quiescence_counter
+            total_depth += ai.completed_depth
+            total_nodes += nodes
+            total_time += elapsed
+            print(f"{workers} workers | {position:<12} | {move.get_chess_notation(state):<6} | "
+                  f"depth {ai.completed_depth:>2} | {nodes:>8} nodes | {nodes / elapsed:8.0f} nodes/s")
+        ai.stop_lazy_smp()
+        speed = total_nodes / total_time
+        base_speed = base_speed or speed
+        print(f"{workers} workers | {'Total':<12} | {'':<6} | depth {total_depth / len(benchmark_positions):4.1f} | "
+              f"{total_nodes:>8} nodes | {speed:8.0f} nodes/s | scaling {speed / base_speed:4.2f}x")
+    k.timeout, k.smp_workers = settings
+
+
+def generated_square_attacked(state, row, col):
+    """Previous square_attacked implementation
+       (generates every opponent move and
+       scans for the given square), kept
+       as the benchmark reference
+
+       Keyword arguments:
+       state -- information about chess game
+       row   -- (0-7)
+       col   -- (0-7)
+    """
+    state.white_moves = not state.white_moves
+    opponent_moves = state.get_all_possible_moves()
+    state.white_moves = not state.white_moves
+    for move in opponent_moves:
+        if move.end_row == row and move.end_col == col:
+            return True
+    return False
+
+
+def benchmark_square_attacked(repetitions=20):
+    """Compares the attack query of GameState
+       with the move generation based one
+       on every square of the benchmark positions
+
+       Keyword arguments:
+       repetitions -- how many times every position is queried
+    """
+    for name, fen in benchmark_positions.items():
+        state = chess_engine.GameState.from_fen(fen)
+        state.get_valid_moves()
+        squares = [(row, col) for row in range(8) for col in range(8)]
+        timings = []
+        for attack_function in (generated_square_attacked, chess_engine.GameState.square_attacked):
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                for row, col in squares:
+                    attack_function(state, row, col)
+            timings.append((time.perf_counter() - start) / (repetitions * len(squares)))
+        print(f"{name:<12} | move generation {timings[0] * 1e6:8.2f} us/query | "
+              f"attack query {timings[1] * 1e6:6.2f} us/query | speedup {timings[0] / timings[1]:6.1f}x")
+
+
+def benchmark_moves(repetitions=200):
+    """Reports the memory and the allocation
+       time of the Move objects generated for
+       the benchmark positions
+
+       Keyword arguments:
+       repetitions -- how many times the moves are generated
+    """
+    for name, fen in benchmark_positions.items():
+        state = chess_engine.GameState.from_fen(fen)
+        tracemalloc.start()
+        valid_moves = state.get_valid_moves()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        squares = [((move.start_row, move.start_col), (move.end_row, move.end_col)) for move in valid_moves]
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            for start_square, end_square in squares:
+                chess_engine.Move(start_square, end_square, state)
+        elapsed = (time.perf_counter() - start) / (repetitions * len(squares))
+        print(f"{name:<12} | {len(valid_moves):>3} moves | {memory / len(valid_moves):7.1f} bytes/move | "
+              f"{elapsed * 1e6:6.2f} us/move")
+
+
+def benchmark_snapshot(repetitions=2000):
+    """Reports the size of the pickled snapshot
+       of every benchmark position and the time
+       needed to take it and to rebuild the state
+
+       Keyword arguments:
+       repetitions -- how many times the snapshot is taken / rebuilt
+    """
+    for backend, game_state in chess_bitboard.game_state_backends.items():
+        for name, fen in benchmark_positions.items():
+            state = game_state.from_fen(fen)
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                snapshot = state.get_snapshot()
+            snapshot_time = (time.perf_counter() - start) / repetitions
+            start = time.perf_counter()
+            for _ in range(repetitions):
+                game_state.from_snapshot(snapshot)
+            rebuild_time = (time.perf_counter() - start) / repetitions
+            print(f"{backend:<8} | {name:<12} | {len(pickle.dumps(snapshot)):>4} bytes | "
+                  f"snapshot {snapshot_time * 1e6:6.2f} us | from_snapshot {rebuild_time * 1e6:7.2f} us")
+
+
+benchmarks = {"search": benchmark_search,
+              "iterative_deepening": benchmark_iterative_deepening,
+              "pruning": benchmark_pruning,
+              "lazy_smp": benchmark_lazy_smp,
+              "moves": benchmark_moves,
+              "square_attacked": benchmark_square_attacked,
+              "snapshot": benchmark_snapshot}
+
+
+def main():
+    """Runs the benchmarks given as
+       command line arguments (all of
+       them if none is given)
+    """
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(benchmarks)
+    for name in names:
+        print(f"---------- {name} ----------")
+        benchmarks[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+import chess_engine
+import chess_constants as k
+
+"""Bitboard backend of the chess engine
+   Every piece type of every color is a 64 bit Python int
+   (bit row * 8 + col set when the piece is on that square),
+   the list board is kept in sync for the view and the PGN notation
+"""
+
+# Bit masks computed once from the square tables of chess_constants
+knight_masks = [sum(1 << (row * 8 + col) for row, col in k.knight_squares[square // 8][square % 8])
+                for square in range(64)]
+king_masks = [sum(1 << (row * 8 + col) for row, col in k.king_squares[square // 8][square % 8])
+              for square in range(64)]
+# ray_masks[square][i] -- squares in the k.king_offsets[i] direction
+ray_masks = [[sum(1 << (row * 8 + col) for row, col in ray) for ray in k.ray_squares[square // 8][square % 8]]
+             for square in range(64)]
+# the squares of the rays going towards higher bits (the nearest blocker is the lowest bit)
+positive_rays = tuple(i for i, (d_row, d_col) in enumerate(k.king_offsets) if d_row * 8 + d_col > 0)
+pawn_attack_masks = {increment: [sum(1 << (row * 8 + col)
+                                     for row, col in k.pawn_attack_squares[increment][square // 8][square % 8])
+                                 for square in range(64)] for increment in (-1, 1)}
+pieces = ("wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")
+
+
+def get_ray_attacks(square, direction, occupancy):
+    """Returns the squares attacked along a ray
+       (up to and including the first blocker)
+
+       Keyword arguments:
+       square    -- (0-63)
+       direction -- index of the direction in k.king_offsets
+       occupancy -- bitboard of every piece
+    """
+    ray = ray_masks[square][direction]
+    blockers = ray & occupancy
+    if blockers:
+        if direction in positive_rays:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        ray ^= ray_masks[blocker][direction]
+    return ray
+
+
+def get_rook_attacks(square, occupancy):
+    """Returns the squares attacked by a rook
+
+       Keyword arguments:
+       square    -- (0-63)
+       occupancy -- bitboard of every piece
+    """
+    return get_ray_attacks(square, 0, occupancy) | get_ray_attacks(square, 1, occupancy) | \
+        get_ray_attacks(square, 2, occupancy) | get_ray_attacks(square, 3, occupancy)
+
+
+def get_bishop_attacks(square, occupancy):
+    """Returns the squares attacked by a bishop
+
+       Keyword arguments:
+       square    -- (0-63)
+       occupancy -- bitboard of every piece
+    """
+    return get_ray_attacks(square, 4, occupancy) | get_ray_attacks(square, 5, occupancy) | \
+        get_ray_attacks(square, 6, occupancy) | get_ray_attacks(square, 7, occupancy)
+
+
+def count_squares(bitboard):
+    """Returns the number of bits
+       set in the bitboard
+
+       Keyword arguments:
+       bitboard -- Python int
+    """
+    return bin(bitboard).count("1")
+
+
+def get_squares(bitboard):
+    """Yields the squares (0-63)
+       of the bits set in the bitboard
+
+       Keyword arguments:
+       bitboard -- Python int
+    """
+    while bitboard:
+        bit = bitboard & -bitboard
+        yield bit.bit_length() - 1
+        bitboard ^= bit
+
+
+class BitboardGameState(chess_engine.GameState):
+    """GameState whose move generation works
+       on bitboards (same make_move / undo_move /
+       get_valid_moves contract as GameState)
+    """
+    def __init__(self, refresh=True):
+        self.bitboards = {}
+        self.occupancy = {"w": 0, "b": 0}
+        super().__init__(refresh)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Returns a new game state (ready to be
+           searched) built from get_snapshot's tuple
+
+           Keyword arguments:
+           snapshot -- tuple returned by get_snapshot
+        """
+        state = super().from_snapshot(snapshot)
+        state.refresh_bitboards()
+        return state
+
+    def refresh_position_state(self):
+        """Recomputes the hash key, the score and the
+           bitboards of the board (after the board was set up)
+        """
+        super().refresh_position_state()
+        self.refresh_bitboards()
+
+    def refresh_bitboards(self):
+        """Builds the bitboards from the list board
+        """
+        self.bitboards = {piece: 0 for piece in pieces}
+        self.occupancy = {"w": 0, "b": 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != k.empty:
+                    self.bitboards[piece] |= 1 << (row * 8 + col)
+                    self.occupancy[piece[0]] |= 1 << (row * 8 + col)
+
+    def make_move(self, move, search_mode=False):
+        """Makes the given move and updates
+           the game state (bitboards included)
+
+           Keyword arguments:
+           move        -- Move object (start row, start col, end row, end col)
+           search_mode -- True inside a search (the PGN notation is not computed)
+        """
+        if not search_mode:
+            self.last_ambiguous_moves = self.get_ambiguous_moves()
+        super().make_move(move, search_mode=True)
+        self.toggle_move(move)
+        if not search_mode:
+            self.append_pgn(move)
+
+    def undo_move(self):
+        """Inverse make_move operation
+           Sets the game state back to it's last
+        """
+        if len(self.move_log) != 0:
+            move = self.move_log[-1]
+            super().undo_move()
+            self.toggle_move(move)
+
+    def toggle_move(self, move):
+        """Moves the pieces of the move on the bitboards
+           (every change is a XOR, so the same call
+           makes and takes back the move)
+
+           Keyword arguments:
+           move -- Move object (start row, start col, end row, end col)
+        """
+        start_bit = 1 << (move.start_row * 8 + move.start_col)
+        end_bit = 1 << (move.end_row * 8 + move.end_col)
+        ally = move.piece_to_move[0]
+        self.bitboards[move.piece_to_move] ^= start_bit
+        self.bitboards[ally + "Q" if move.is_pawn_promotion else move.piece_to_move] ^= end_bit
+        self.occupancy[ally] ^= start_bit | end_bit
+        if move.place_to_go != k.empty:
+            captured_bit = 1 << (move.start_row * 8 + move.end_col) if move.en_passant_move else end_bit
+            self.bitboards[move.place_to_go] ^= captured_bit
+            self.occupancy[move.place_to_go[0]] ^= captured_bit
+        if move.castle_move:
+            if move.end_col - move.start_col == 2:
+                rook_bits = end_bit << 1 | end_bit >> 1
+            else:
+                rook_bits = end_bit >> 2 | end_bit << 1
+            self.bitboards[ally + "R"] ^= rook_bits
+            self.occupancy[ally] ^= rook_bits
+
+    def attacked_by(self, square, enemy, occupancy, captured_bit=0):
+        """Return true if the square is attacked
+           by any piece of the given color
+
+           Keyword arguments:
+           square       -- (0-63)
+           enemy        -- color of the attacking pieces ("w" or "b")
+           occupancy    -- bitboard of every piece
+           captured_bit -- bit of an enemy piece which is no longer on the board
+        """
+        bitboards = self.bitboards
+        alive = ~captured_bit
+        increment = 1 if enemy == "w" else -1
+        if pawn_attack_masks[increment][square] & bitboards[enemy + "P"] & alive:
+            return True
+        if knight_masks[square] & bitboards[enemy + "N"] & alive:
+            return True
+        if king_masks[square] & bitboards[enemy + "K"]:
+            return True
+        queens = bitboards[enemy + "Q"]
+        if get_rook_attacks(square, occupancy) & (bitboards[enemy + "R"] | queens) & alive:
+            return True
+        return bool(get_bishop_attacks(square, occupancy) & (bitboards[enemy + "B"] | queens) & alive)
+
+    def square_attacked(self, row, col):
+        """Return true if the square
+           with the coordinates (row, col)
+           is attacked by any enemy piece
+
+           Keyword arguments:
+           row -- (0-7)
+           col -- (0-7)
+        """
+        return self.attacked_by(row * 8 + col, "b" if self.white_moves else "w",
+                                self.occupancy["w"] | self.occupancy["b"])
+
+    def has_non_pawn_material(self):
+        """Return true if the current player has
+           a piece besides the king and the pawns
+        """
+        ally = "w" if self.white_moves else "b"
+        bitboards = self.bitboards
+        return bool(self.occupancy[ally] & ~(bitboards[ally + "K"] | bitboards[ally + "P"]))
+
+    def king_helper(self):
+        """Returns the state of the king (the move generation
+           tests the legality of every move, so the
+           pins and checks are not needed)
+        """
+        return self.in_check(), [], []
+
+    def get_check_masks(self):
+        """Returns the pieces giving check, the squares
+           that stop the check (capture or block, all of
+           them if there's no check, none in double check)
+           and the pinned pieces of the current player
+        """
+        ally, enemy = ("w", "b") if self.white_moves else ("b", "w")
+        bitboards = self.bitboards
+        own = self.occupancy[ally]
+        occupancy = own | self.occupancy[enemy]
+        king_square = bitboards[ally + "K"].bit_length() - 1
+        increment = -1 if self.white_moves else 1
+
+        checkers = (pawn_attack_masks[increment][king_square] & bitboards[enemy + "P"]) | \
+                   (knight_masks[king_square] & bitboards[enemy + "N"])
+        evasion_mask = checkers
+        pinned = 0
+        for direction in range(8):
+            sliders = bitboards[enemy + ("R" if direction < 4 else "B")] | bitboards[enemy + "Q"]
+            if not ray_masks[king_square][direction] & sliders:
+                continue
+            ray = get_ray_attacks(king_square, direction, occupancy)
+            if ray & sliders:
+                checkers |= ray & sliders
+                evasion_mask |= ray
+            elif ray & own:
+                if get_ray_attacks(king_square, direction, occupancy ^ (ray & own)) & sliders:
+                    pinned |= ray & own
+        if checkers & (checkers - 1):
+            # double check: only the king can move
+            evasion_mask = 0
+        elif not checkers:
+            evasion_mask = ~0
+        return checkers, evasion_mask, pinned
+
+    def get_all_possible_moves(self, captures=None):
+        """Returns the legal moves (castle moves excluded)
+           generated from the bitboards
+
+           Keyword arguments:
+           captures -- True for captures (and promotions) only,
+                       False for quiet moves only, None for both
+        """
+        moves = []
+        ally, enemy = ("w", "b") if self.white_moves else ("b", "w")
+        bitboards = self.bitboards
+        own = self.occupancy[ally]
+        opponent = self.occupancy[enemy]
+        occupancy = own | opponent
+        if captures is True:
+            target_mask = opponent
+        elif captures is False:
+            target_mask = ~occupancy
+        else:
+            target_mask = ~own
+        king_square = bitboards[ally + "K"].bit_length() - 1
+        increment = -1 if self.white_moves else 1
+        checkers, evasion_mask, pinned = self.get_check_masks()
+
+        def add_move(start_square, end_square, en_passant=False):
+            start_bit = 1 << start_square
+            end_bit = 1 << end_square
+            if start_square == king_square:
+                if self.attacked_by(end_square, enemy, occupancy ^ start_bit, end_bit & opponent):
+                    return
+            elif en_passant:
+                captured_bit = 1 << (start_square & ~7 | end_square & 7)
+                if not evasion_mask or self.attacked_by(king_square, enemy,
+                                                        occupancy ^ start_bit ^ captured_bit | end_bit, captured_bit):
+                    return
+            elif not end_bit & evasion_mask:
+                return
+            elif start_bit & pinned:
+                if self.attacked_by(king_square, enemy, occupancy ^ start_bit | end_bit, end_bit & opponent):
+                    return
+            k.insert_move_ordering(moves, chess_engine.Move((start_square // 8, start_square % 8),
+                                                            (end_square // 8, end_square % 8),
+                                                            self, en_passant=en_passant))
+
+        start_pos = 6 if increment == -1 else 1
+        en_passant_bit = 1 << (self.en_passant[0] * 8 + self.en_passant[1]) if self.en_passant != () else 0
+        for square in get_squares(bitboards[ally + "P"]):
+            forward = square + 8 * increment
+            if not occupancy >> forward & 1:
+                promotion = forward < 8 or forward >= 56
+                if captures is None or captures == promotion:
+                    add_move(square, forward)
+                double_forward = forward + 8 * increment
+                if captures is not True and square // 8 == start_pos and not occupancy >> double_forward & 1:
+                    add_move(square, double_forward)
+            if captures is not False:
+                attacks = pawn_attack_masks[increment][square]
+                for end_square in get_squares(attacks & opponent):
+                    add_move(square, end_square)
+                if attacks & en_passant_bit:
+                    add_move(square, en_passant_bit.bit_length() - 1, en_passant=True)
+
+        for square in get_squares(bitboards[ally + "N"]):
+            for end_square in get_squares(knight_masks[square] & target_mask):
+                add_move(square, end_square)
+        for square in get_squares(bitboards[ally + "B"]):
+            for end_square in get_squares(get_bishop_attacks(square, occupancy) & target_mask):
+                add_move(square, end_square)
+        for square in get_squares(bitboards[ally + "R"]):
+            for end_square in get_squares(get_rook_attacks(square, occupancy) & target_mask):
+                add_move(square, end_square)
+        for square in get_squares(bitboards[ally + "Q"]):
+            for end_square in get_squares((get_rook_attacks(square, occupancy) |
+                                           get_bishop_attacks(square, occupancy)) & target_mask):
+                add_move(square, end_square)
+        for end_square in get_squares(king_masks[king_square] & target_mask):
+            add_move(king_square, end_square)
+        return moves
+
+    def get_mobility(self):
+        """Returns the number of valid moves of every
+           piece type of the current player (castle moves
+           are counted as king moves) without creating
+           the Move objects (in check the evasions are generated)
+        """
+        mobility = {"P": 0, "N": 0, "B": 0, "R": 0, "Q": 0, "K": 0}
+        checkers, evasion_mask, pinned = self.get_check_masks()
+        if checkers:
+            for move in self.get_valid_moves():
+                mobility[move.piece_to_move[1]] += 1
+            return mobility
+
+        ally, enemy = ("w", "b") if self.white_moves else ("b", "w")
+        bitboards = self.bitboards
+        own = self.occupancy[ally]
+        opponent = self.occupancy[enemy]
+        occupancy = own | opponent
+        king_square = bitboards[ally + "K"].bit_length() - 1
+        increment = -1 if self.white_moves else 1
+        start_pos = 6 if self.white_moves else 1
+
+        def get_pinned_targets(square, targets):
+            # a pinned piece stays on the line of its king
+            for ray in ray_masks[king_square]:
+                if ray & 1 << square:
+                    return targets & ray
+            return 0
+
+        for square in get_squares(bitboards[ally + "P"]):
+            targets = 0
+            forward = square + 8 * increment
+            if not occupancy >> forward & 1:
+                targets |= 1 << forward
+                double_forward = forward + 8 * increment
+                if square // 8 == start_pos and not occupancy >> double_forward & 1:
+                    targets |= 1 << double_forward
+            targets |= pawn_attack_masks[increment][square] & opponent
+            if pinned >> square & 1:
+                targets = get_pinned_targets(square, targets)
+            mobility["P"] += count_squares(targets)
+        if self.en_passant != ():
+            # the en passant capture may uncover a check along the rank
+            mobility["P"] += sum(move.en_passant_move for move in self.get_all_possible_moves(captures=True))
+
+        for piece_type in ("N", "B", "R", "Q"):
+            for square in get_squares(bitboards[ally + piece_type]):
+                if piece_type == "N":
+                    targets = knight_masks[square]
+                elif piece_type == "B":
+                    targets = get_bishop_attacks(square, occupancy)
+                elif piece_type == "R":
+                    targets = get_rook_attacks(square, occupancy)
+                else:
+                    targets = get_rook_attacks(square, occupancy) | get_bishop_attacks(square, occupancy)
+                targets &= ~own
+                if pinned >> square & 1:
+                    targets = get_pinned_targets(square, targets) if piece_type != "N" else 0
+                mobility[piece_type] += count_squares(targets)
+
+        king_bit = 1 << king_square
+        for end_square in get_squares(king_masks[king_square] & ~own):
+            if not self.attacked_by(end_square, enemy, occupancy ^ king_bit, 1 << end_square & opponent):
+                mobility["K"] += 1
+        if not k.imported:
+            castle_moves = []
+            (king_row, king_col) = self.white_king_location if self.white_moves else self.black_king_location
+            self.get_castle_moves(king_row, king_col, castle_moves)
+            mobility["K"] += len(castle_moves)
+        return mobility
+
+    def get_valid_moves(self):
+        """Returns the legal moves generated from the
+           bitboards and the castle moves (if any)
+           Set state to checkmate / stalemate if no valid moves
+        """
+        self.checked, self.pins, self.checks = self.king_helper()
+        moves = self.get_all_possible_moves()
+        if not self.checked and not k.imported:
+            (king_row, king_col) = self.white_king_location if self.white_moves else self.black_king_location
+            self.get_castle_moves(king_row, king_col, moves)
+
+        if len(moves) == 0:
+            self.checkmate = self.checked
+            self.stalemate = not self.checked
+        else:
+            self.checkmate = False
+            self.stalemate = False
+
+        self.valid_moves_counter = len(moves)
+        return moves
+
+    def get_move_from_id(self, move_id):
+        """Returns the valid move with the given
+           id (e.g. the best move stored in the
+           transposition table), None if there's
+           no such move in the current position
+
+           Keyword arguments:
+           move_id -- start and end squares packed in one int (Move.move_id)
+        """
+        for move in self.get_valid_moves():
+            if move.move_id == move_id:
+                return move
+        return None
+
+    def static_exchange_evaluation(self, move):
+        """Returns the material won (centipawns) by
+           the move if both players keep capturing on
+           its end square with their least valuable
+           piece while it pays off (the attacks are
+           recomputed without the pieces already
+           used, which uncovers the x-ray attackers)
+
+           Keyword arguments:
+           move -- Move object (start row, start col, end row, end col)
+        """
+        values = k.exchange_scores
+        bitboards = self.bitboards
+        square = move.end_row * 8 + move.end_col
+        occupancy = (self.occupancy["w"] | self.occupancy["b"]) & ~(1 << (move.start_row * 8 + move.start_col))
+        if move.en_passant_move:
+            occupancy &= ~(1 << (move.start_row * 8 + move.end_col))
+
+        gains = [values[move.place_to_go[1]]]
+        piece_on_square = move.piece_to_move[1]
+        if move.is_pawn_promotion:
+            gains[0] += values["Q"] - values["P"]
+            piece_on_square = "Q"
+        side = "b" if move.piece_to_move[0] == "w" else "w"
+        while True:
+            increment = 1 if side == "w" else -1
+            bishop_attacks = get_bishop_attacks(square, occupancy)
+            rook_attacks = get_rook_attacks(square, occupancy)
+            attack_masks = (("P", pawn_attack_masks[increment][square]), ("N", knight_masks[square]),
+                            ("B", bishop_attacks), ("R", rook_attacks), ("Q", bishop_attacks | rook_attacks),
+                            ("K", king_masks[square]))
+            for attacker, attack_mask in attack_masks:
+                attackers = attack_mask & bitboards[side + attacker] & occupancy
+                if attackers:
+                    break
+            else:
+                break
+            # a king capturing a defended piece scores so low that it is never chosen
+            gains.append(values[piece_on_square] - gains[-1])
+            piece_on_square = attacker
+            occupancy ^= attackers & -attackers
+            side = "b" if side == "w" else "w"
+
+        # every player may stop capturing, so the scores are resolved from the last capture
+        while len(gains) > 1:
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    def is_valid_quiet_move(self, move):
+        """Returns true if the given quiet move
+           (e.g. a killer move from another position)
+           is valid in the current position
+
+           Keyword arguments:
+           move -- Move object (start row, start col, end row, end col)
+        """
+        if move.castle_move or move.place_to_go != k.empty or \
+                self.board[move.start_row][move.start_col] != move.piece_to_move or \
+                self.board[move.end_row][move.end_col] != k.empty or \
+                move.piece_to_move[0] != ("w" if self.white_moves else "b"):
+            return False
+        return move in self.get_all_possible_moves(captures=False)
+
+
+# engine backends selectable with k.engine_backend
+game_state_backends = {"list": chess_engine.GameState,
+                       "bitboard": BitboardGameState}
@@ -9,6 +9,7 @@ environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
    methods used in the project
 """
 
+# True when the board is drawn with black at the bottom (the engine board never changes)
 flip = False
 ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4,
                  "5": 3, "6": 2, "7": 1, "8": 0}
@@ -16,17 +17,8 @@ ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4,
 files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3,
                  "e": 4, "f": 5, "g": 6, "h": 7}
 
-ranks_to_rows_flip = {"8": 7, "7": 6, "6": 5, "5": 4,
-                      "4": 3, "3": 2, "2": 1, "1": 0}
-
-files_to_cols_flip = {"h": 0, "g": 1, "f": 2, "e": 3,
-                      "d": 4, "c": 5, "b": 6, "a": 7}
-
-ranks_dict = ranks_to_rows
-files_dict = files_to_cols
-
-rows_to_ranks = {v: k for k, v in ranks_dict.items()}
-cols_to_files = {v: k for k, v in files_dict.items()}
+rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
+cols_to_files = {v: k for k, v in files_to_cols.items()}
 
 ########################################################################################################################
 # Default Interface Constants
@@ -63,6 +55,49 @@ algorithm_depth_offset_y = 95
 timeout = 0
 engine_used = False
 depth = 3
+# board representation of the engine: "list" (GameState) or "bitboard" (BitboardGameState)
+engine_backend = "list"
+# memory of the transposition table of the negamax searches (MB)
+transposition_table_mb = 16
+# search the captures after the last ply of the negamax searches
+quiescence = True
+# delta pruning margin of the quiescence search (pawns)
+delta_margin = 2
+# null window searches of the moves after the first one (iterative deepening search)
+principal_variation_search = True
+# width of the null window (pawns, below the smallest score difference)
+null_window = 0.001
+# half width of the first window of an iteration around the previous score (pawns, 0 for the full window)
+aspiration_window = 1
+# null move pruning of the negamax searches (not in check and not with only the king and pawns)
+null_move_pruning = True
+# depth reduction of the null move search (after the null move itself)
+null_move_reduction = 2
+# reduced search of the late quiet moves of the negamax searches (re-searched if they raise alpha)
+late_move_reductions = True
+# moves searched at full depth in a node before the quiet moves are reduced
+late_move_threshold = 3
+# smallest depth of a node with reduced moves
+late_move_min_depth = 3
+# depth reduction of a late quiet move
+late_move_reduction = 1
+# game clock of the engine in the negamax_pruning_id_clock mode (s)
+clock_base = 300
+clock_increment = 2
+# moves the remaining clock time is shared by
+moves_to_go = 30
+# hard limit of the search time (multiple of the allocated time)
+hard_time_ratio = 3
+# largest share of the remaining clock time used by one search
+max_time_ratio = 0.5
+# extension of the soft limit when an iteration changes the best move
+best_move_change_ratio = 1.5
+# expected time ratio of consecutive iterations (no new iteration if it can't end before the hard limit)
+iteration_time_growth = 4
+# nodes searched between two clock reads of the iterative deepening search
+time_poll_nodes = 256
+# worker processes of the Lazy SMP search (negamax_pruning_id_smp_t_5 mode)
+smp_workers = 4
 ai_vs_ai_caption = "AI vs AI"
 white_vs_ai_caption = "Human (White) vs AI (Black)"
 ai_vs_black_caption = "AI (White) vs Human (Black)"
@@ -101,15 +136,6 @@ default_board = [["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
                  ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
                  ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
 
-default_flipped_board = [["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"],
-                         ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
-                         ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                         ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                         ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                         ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                         ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
-                         ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"]]
-
 pieces = ['wP', 'wR', 'wN', 'wB', 'wK', 'wQ', 'bP', 'bR', 'bN', 'bB', 'bK', 'bQ']
 
 buttons = {
@@ -401,14 +427,55 @@ developing_moves_black_init =\
 developing_moves_white = ["d4", "e4", "c4", "b3", "g3", "Nc3", "Nbd2", "Nf3", "Ne2", "Bg2", "Bb2", "Bc4", "Bb5", "Bd3"]
 developing_moves_black = ["d5", "e5", "c5", "b6", "g6", "Nc6", "Nbd7", "Nf6", "Ne6", "Bg7", "Bb7", "Bc5", "Be7", "Bd6"]
 
+knight_offsets = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+king_offsets = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# Lookup tables computed once, so that the move generators don't do bounds checks
+# knight_squares[row][col] / king_squares[row][col] -- squares reached with one jump / step
+knight_squares = [[tuple((row + d_row, col + d_col) for d_row, d_col in knight_offsets
+                         if 0 <= row + d_row <= 7 and 0 <= col + d_col <= 7) for col in range(8)] for row in range(8)]
+king_squares = [[tuple((row + d_row, col + d_col) for d_row, d_col in king_offsets
+                       if 0 <= row + d_row <= 7 and 0 <= col + d_col <= 7) for col in range(8)] for row in range(8)]
+# ray_squares[row][col][i] -- squares in the king_offsets[i] direction, nearest first
+# (the first 4 directions are orthogonal, the last 4 diagonal)
+ray_squares = [[tuple(tuple((row + d_row * i, col + d_col * i) for i in range(1, 8)
+                            if 0 <= row + d_row * i <= 7 and 0 <= col + d_col * i <= 7)
+                      for d_row, d_col in king_offsets) for col in range(8)] for row in range(8)]
+# pawn_attack_squares[increment][row][col] -- squares attacked by a pawn moving `increment` rows
+pawn_attack_squares = {increment: [[tuple((row + increment, col + d_col) for d_col in (-1, 1)
+                                          if 0 <= row + increment <= 7 and 0 <= col + d_col <= 7)
+                                    for col in range(8)] for row in range(8)] for increment in (-1, 1)}
+
+mvv_lva_scores = {"Q": 500, "R": 400, "B": 350, "N": 300, "P": 100, "x": 0, "K": 200}
 piece_score = {"K": 0, "Q": 9.5, "R": 5.1, "B": 3.2, "N": 3, "P": 1}
+# piece values of the static exchange evaluation (centipawns, the king can't be recaptured)
+exchange_scores = {"Q": 950, "R": 510, "B": 320, "N": 300, "P": 100, "x": 0, "K": 10000}
+
+# material + piece position score of every piece on every square (negative for black pieces)
+piece_square_scores = {piece: [[(1 if piece[0] == "w" else -1) * (piece_score[piece[1]] + position_score * 0.05)
+                                for position_score in row] for row in piece_position_scores[piece].tolist()]
+                       for piece in piece_position_scores}
 CHECKMATE = 1000
 STALEMATE = 0
 MAX_DEPTH = 10
+# bound types of the transposition table scores
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+########################################################################################################################
+# Zobrist Hashing Keys
+
+zobrist_random = random.Random(2022)
+zobrist_pieces = {piece: [[zobrist_random.getrandbits(64) for _ in range(8)] for _ in range(8)] for piece in pieces}
+zobrist_black_to_move = zobrist_random.getrandbits(64)
+zobrist_castling = {flag: zobrist_random.getrandbits(64) for flag in ("wks", "bks", "wqs", "bqs")}
+zobrist_en_passant = [zobrist_random.getrandbits(64) for _ in range(8)]
 
 algorithm_count = 0
 algorithms = ["negamax_pruning", "minimax", "negamax_pruning_id_t_2",
-              "negamax_pruning_id_t_5", "negamax_pruning_id_t_10", "mcts"]
+              "negamax_pruning_id_t_5", "negamax_pruning_id_t_10", "negamax_pruning_id_clock",
+              "negamax_pruning_id_smp_t_5", "mcts"]
 current_algorithm = "negamax_pruning"
 
 
@@ -421,10 +488,10 @@ def find_random_move(valid_moves):
 
 def get_pgn_move(index, pgn_moves, valid_moves):
     pgn_move = str(pgn_moves[index])
-    start_row = ranks_dict[pgn_move[1]]
-    start_col = files_dict[pgn_move[0]]
-    end_row = ranks_dict[pgn_move[3]]
-    end_col = files_dict[pgn_move[2]]
+    start_row = ranks_to_rows[pgn_move[1]]
+    start_col = files_to_cols[pgn_move[0]]
+    end_row = ranks_to_rows[pgn_move[3]]
+    end_col = files_to_cols[pgn_move[2]]
 
     for move in valid_moves:
         if move.start_row == start_row and move.start_col == start_col \
@@ -2,6 +2,7 @@ import csv
 
 import chess_pgn_parser
 import chess_engine
+import chess_bitboard
 import chess_main as main
 import chess_constants as k
 import chess_ai
@@ -9,7 +10,6 @@ import chess_mcts
 import os
 import pygame as p
 import time
-import numpy as np
 import sys
 from datetime import date
 from datetime import datetime
@@ -23,7 +23,8 @@ class ChessController:
     def __init__(self, view):
         self.view = view
         self.view.load_images()
-        self.model = chess_engine.GameState()
+        self.model = chess_bitboard.game_state_backends[k.engine_backend]()
+        k.flip = False
 
         self.human_turn = None
         self.game_over = False
@@ -41,6 +42,7 @@ class ChessController:
         self.progress_pgn = False
         self.player_one = None
         self.player_two = None
+        self.ai = None
 
         self.handler_functions = {
             "buttonAIvsAI": self.ai_vs_ai_handler,
@@ -67,26 +69,28 @@ class ChessController:
         model = self.model
         view = self.view
 
-        delta_row = move.end_row - move.start_row
-        delta_col = move.end_col - move.start_col
+        start_row, start_col = view.get_view_square(move.start_row, move.start_col)
+        end_row, end_col = view.get_view_square(move.end_row, move.end_col)
+        delta_row = end_row - start_row
+        delta_col = end_col - start_col
         frame_count = k.frames_per_square * (abs(delta_row) + abs(delta_col))
         colors = [p.Color("light gray"), p.Color("purple")]
 
         for frame in range(frame_count + 1):
-            row, col = (move.start_row + delta_row * frame / frame_count,
-                        move.start_col + delta_col * frame / frame_count)
+            row, col = (start_row + delta_row * frame / frame_count,
+                        start_col + delta_col * frame / frame_count)
             view.draw_squares()
             view.draw_pieces(view.screen, model.board)
-            color = colors[(move.end_row + move.end_col) % 2]
+            color = colors[(end_row + end_col) % 2]
 
-            end_square = p.Rect(move.end_col * k.SQUARE_SIZE, move.end_row * k.SQUARE_SIZE,
+            end_square = p.Rect(end_col * k.SQUARE_SIZE, end_row * k.SQUARE_SIZE,
                                 k.SQUARE_SIZE, k.SQUARE_SIZE)
             p.draw.rect(view.screen, color, end_square)
 
             if move.place_to_go != k.empty:
                 if move.en_passant_move:
-                    en_passant_row = move.end_row + 1 if move.place_to_go[0] == "b" else move.end_row - 1
-                    end_square = p.Rect(move.end_col * k.SQUARE_SIZE, en_passant_row * k.SQUARE_SIZE,
+                    en_passant_row, en_passant_col = view.get_view_square(move.start_row, move.end_col)
+                    end_square = p.Rect(en_passant_col * k.SQUARE_SIZE, en_passant_row * k.SQUARE_SIZE,
                                         k.SQUARE_SIZE, k.SQUARE_SIZE)
                 view.screen.blit(view.IMAGES[move.place_to_go], end_square)
 
@@ -116,8 +120,9 @@ class ChessController:
             s = p.Surface((k.SQUARE_SIZE, k.SQUARE_SIZE))
             s.set_alpha(k.highlight_alpha)
             s.fill(k.highlight_color)
-            view.screen.blit(s, (last_move.start_col * k.SQUARE_SIZE, last_move.start_row * k.SQUARE_SIZE))
-            view.screen.blit(s, (last_move.end_col * k.SQUARE_SIZE, last_move.end_row * k.SQUARE_SIZE))
+            for row, col in ((last_move.start_row, last_move.start_col), (last_move.end_row, last_move.end_col)):
+                row, col = view.get_view_square(row, col)
+                view.screen.blit(s, (col * k.SQUARE_SIZE, row * k.SQUARE_SIZE))
 
         if square_clicked != ():
             row, col = square_clicked
@@ -125,13 +130,15 @@ class ChessController:
                 surface = p.Surface((k.SQUARE_SIZE, k.SQUARE_SIZE))
                 surface.set_alpha(k.highlight_alpha)
                 surface.fill(k.click_color)
-                view.screen.blit(surface, (col * k.SQUARE_SIZE, row * k.SQUARE_SIZE))
+                view_row, view_col = view.get_view_square(row, col)
+                view.screen.blit(surface, (view_col * k.SQUARE_SIZE, view_row * k.SQUARE_SIZE))
 
                 surface.fill(k.click_color)
                 for move in self.valid_moves:
                     if move.start_row == row and move.start_col == col:
-                        view.screen.blit(surface, (k.SQUARE_SIZE * move.end_col,
-                                                   k.SQUARE_SIZE * move.end_row))
+                        view_row, view_col = view.get_view_square(move.end_row, move.end_col)
+                        view.screen.blit(surface, (k.SQUARE_SIZE * view_col,
+                                                   k.SQUARE_SIZE * view_row))
 
     def draw_game_state(self, ai):
         """Updates all view components from
@@ -291,24 +298,18 @@ class ChessController:
 
     def flip_handler(self):
         """F pressed -> board will be flipped
+           (only the view is turned around,
+           the game state is not changed)
         """
-        self.model.board = np.flip(self.model.board)
         k.flip = not k.flip
-        if k.flip:
-            k.ranks_dict = k.ranks_to_rows_flip
-            k.files_dict = k.files_to_cols_flip
-        else:
-            k.ranks_dict = k.ranks_to_rows
-            k.files_dict = k.files_to_cols
-
-        k.rows_to_ranks = {v: c for c, v in k.ranks_dict.items()}
-        k.cols_to_files = {v: c for c, v in k.files_dict.items()}
 
-        self.model.white_king_location = (7 - self.model.white_king_location[0],
-                                          self.model.white_king_location[1])
-        self.model.black_king_location = (7 - self.model.black_king_location[0],
-                                          self.model.black_king_location[1])
-        self.valid_moves = self.model.get_valid_moves()
+    def return_main_menu(self):
+        """Stops the search workers of the
+           current game and displays the main menu
+        """
+        if self.ai is not None:
+            self.ai.stop_lazy_smp()
+        main.main()
 
     def undo_handler(self):
         self.model.undo_move()
@@ -328,6 +329,7 @@ class ChessController:
 
     def endgame_handler(self, ai):
         self.game_over = True
+        ai.stop_lazy_smp()
         if not self.model.draw_rule:
             text = k.stalemate_text if self.model.stalemate else k.checkmate_black_text \
                 if self.model.white_moves else k.checkmate_white_text
@@ -347,10 +349,11 @@ class ChessController:
             try:
                 with open(k.last_agent_game_logs, 'w') as f:
                     write = csv.writer(f)
-                    write.writerow(["Move", "Nodes", "Score", "Time [s]"])
+                    write.writerow(["Move", "Nodes", "Quiescence nodes", "First move cutoffs [%]", "Score", "Time [s]",
+                                    "TT hits", "TT stores", "TT collisions"])
                     write.writerows(ai.agent_data)
             except PermissionError:
-                main.main()
+                self.return_main_menu()
 
     def key_handler(self, event, import_pgn, window_text):
         if event.key == p.K_z:
@@ -360,7 +363,7 @@ class ChessController:
                 self.pgn_count -= 1
 
         if event.key == p.K_r:
-            main.main()
+            self.return_main_menu()
 
         if event.key == p.K_UP or event.key == p.K_DOWN:
             self.play_pgn = not self.play_pgn
@@ -407,7 +410,8 @@ class ChessController:
         state = self.model
         self.saved_game = False
 
-        ai = chess_ai.ChessAI(k.depth)
+        ai = self.ai = chess_ai.ChessAI(k.depth)
+        state.refresh_position_state()
         self.valid_moves = state.get_valid_moves()
 
         clicked = False
@@ -464,9 +468,10 @@ class ChessController:
         state = self.model
         mouse_location = p.mouse.get_pos()
         if not self.game_over:
-            col = mouse_location[0] // k.SQUARE_SIZE
-            row = mouse_location[1] // k.SQUARE_SIZE
-            if self.square_clicked == (row, col) or col >= 8:
+            view_col = mouse_location[0] // k.SQUARE_SIZE
+            view_row = mouse_location[1] // k.SQUARE_SIZE
+            row, col = self.view.get_view_square(view_row, view_col)
+            if self.square_clicked == (row, col) or view_col >= 8:
                 self.square_clicked = ()
                 self.last_clicks = []
             else:
@@ -487,7 +492,7 @@ class ChessController:
         else:
             if self.view.return_main_menu_button.collidepoint((mouse_location[0], mouse_location[1])):
                 k.make_option_sound()
-                main.main()
+                self.return_main_menu()
             if self.view.save_pgn_button.collidepoint((mouse_location[0], mouse_location[1])) and not self.saved_game:
                 k.make_option_sound()
                 pgn_text = k.draw if self.model.stalemate else k.black_win if self.model.white_moves else k.white_win
@@ -554,7 +559,8 @@ class ChessController:
         k.current_algorithm = k.algorithms[k.algorithm_count % len(k.algorithms)]
         if 'id' in k.current_algorithm:
             split_algorithm = k.current_algorithm.split('_')
-            k.timeout = int(split_algorithm[-1])
+            # the clock mode allocates the search time from the game clock
+            k.timeout = 0 if split_algorithm[-1] == 'clock' else int(split_algorithm[-1])
         main.main()
 
     def play_game(self):
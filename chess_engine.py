@@ -9,27 +9,24 @@ class GameState:
        / unmakes a move and
        returns valid moves
     """
-    def __init__(self):
-        k.flip = False
-        if not k.flip:
-            self.board = [["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
-                          ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
-                          ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                          ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                          ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                          ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
-                          ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
-                          ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
-        else:
-            self.board = k.default_flipped_board
+    def __init__(self, refresh=True):
+        # white is always at the bottom (row 7), flipping the board only changes the view
+        self.board = [["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
+                      ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
+                      ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
+                      ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
+                      ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
+                      ["xx", "xx", "xx", "xx", "xx", "xx", "xx", "xx"],
+                      ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
+                      ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
 
         self.move_functions = {'P': self.get_pawn_moves, 'R': self.get_rook_moves, 'N': self.get_knight_moves,
                                'B': self.get_bishop_moves, 'Q': self.get_queen_moves, 'K': self.get_king_moves}
         self.white_moves = True
         self.move_log = []
         self.pgn_log = []
-        self.white_king_location = k.white_king_location if not k.flip else k.black_king_location
-        self.black_king_location = k.black_king_location if not k.flip else k.white_king_location
+        self.white_king_location = k.white_king_location
+        self.black_king_location = k.black_king_location
         self.checkmate = False
         self.stalemate = False
         self.draw_rule = False
@@ -41,57 +38,149 @@ class GameState:
         self.checks = []
         self.en_passant = ()
         self.en_passant_coordinates = None
-        self.en_passant_log = [self.en_passant]
         self.valid_moves_counter = 0
         self.castling_flags = CastleFlags(True, True, True, True)
-        self.castling_log = [CastleFlags(True, True, True, True)]
-        self.eventual_ambiguous_moves = []
         self.last_ambiguous_moves = []
-        self.board_history = []
+        # one record per ply with the state that the move can't give back (see make_move)
+        self.undo_log = []
+        # occurrences of every position (Zobrist key) since the last pawn move or capture
+        self.position_counts = {}
+        self.zobrist_key = 0
         self.undo_flag = False
-        self.chessboard = chess.Board()
-        self.fen_notation = None
+        self._chessboard = None
         self.pawn_moved_white = False
         self.pawn_moved_black = False
         self.white_bishop_counter = 2
         self.black_bishop_counter = 2
         self.repetition_punish = [False, False]
-        self.temp_castling_flags = None
         self.developing_white_moves = 0
         self.developing_black_moves = 0
         self.position_score = 0
-        self.update_board_fen()
+        # from_snapshot sets the hash key and the score itself (no scan of the default board)
+        if refresh:
+            self.refresh_position_state()
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Returns a new game state built
+           from the given FEN notation
+
+           Keyword arguments:
+           fen -- Forsyth-Edwards Notation string
+        """
+        state = cls()
+        fields = fen.split()
+        for row, rank in enumerate(fields[0].split('/')):
+            col = 0
+            for letter in rank:
+                if letter.isdigit():
+                    for _ in range(int(letter)):
+                        state.board[row][col] = k.empty
+                        col += 1
+                else:
+                    piece = ("w" if letter.isupper() else "b") + letter.upper()
+                    state.board[row][col] = piece
+                    if piece == "wK":
+                        state.white_king_location = (row, col)
+                    elif piece == "bK":
+                        state.black_king_location = (row, col)
+                    col += 1
+
+        state.white_moves = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        state.castling_flags = CastleFlags('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        if len(fields) > 3 and fields[3] != '-':
+            state.en_passant = (k.ranks_to_rows[fields[3][1]], k.files_to_cols[fields[3][0]])
+            state.en_passant_coordinates = fields[3]
+        state.fifty_draw_counter = int(fields[4]) if len(fields) > 4 else 0
+        state.white_bishop_counter = sum(row.count("wB") for row in state.board)
+        state.black_bishop_counter = sum(row.count("bB") for row in state.board)
+        state.refresh_position_state()
+        return state
+
+    def get_snapshot(self):
+        """Returns a compact tuple of builtin types
+           (picklable, e.g. for worker processes) with
+           everything the search needs from the position
+           (the move log and the PGN notation are left out)
+        """
+        return ("".join("".join(row) for row in self.board), self.white_moves,
+                (self.castling_flags.wks, self.castling_flags.bks, self.castling_flags.wqs, self.castling_flags.bqs),
+                self.en_passant, self.fifty_draw_counter, self.zobrist_key, tuple(self.position_counts.items()),
+                self.position_score, self.white_king_location, self.black_king_location,
+                self.white_castled, self.black_castled, self.white_bishop_counter, self.black_bishop_counter,
+                self.pawn_moved_white, self.pawn_moved_black, tuple(self.repetition_punish), self.draw_rule)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Returns a new game state (ready to be
+           searched) built from get_snapshot's tuple
 
-    def make_move(self, move):
+           Keyword arguments:
+           snapshot -- tuple returned by get_snapshot
+        """
+        state = cls(refresh=False)
+        (board, state.white_moves, castling_flags, state.en_passant, state.fifty_draw_counter, state.zobrist_key,
+         position_counts, state.position_score, state.white_king_location, state.black_king_location,
+         state.white_castled, state.black_castled, state.white_bishop_counter, state.black_bishop_counter,
+         state.pawn_moved_white, state.pawn_moved_black, repetition_punish, state.draw_rule) = snapshot
+        state.board = [[board[i:i + 2] for i in range(row * 16, row * 16 + 16, 2)] for row in range(8)]
+        state.castling_flags = CastleFlags(*castling_flags)
+        if state.en_passant != ():
+            state.en_passant_coordinates = k.get_file_rank_notation(*state.en_passant)
+        state.repetition_punish = list(repetition_punish)
+        # the hash key and the score come with the snapshot, so nothing is recomputed
+        state.position_counts = dict(position_counts)
+        return state
+
+    def make_move(self, move, search_mode=False):
         """Makes the given move and updates
            the game state
 
            Keyword arguments:
-           move -- Move object (start row, start col, end row, end col)
+           move        -- Move object (start row, start col, end row, end col)
+           search_mode -- True inside a search (the PGN notation is not computed)
         """
-        self.last_ambiguous_moves = self.eventual_ambiguous_moves
+        if not search_mode:
+            self.last_ambiguous_moves = self.get_ambiguous_moves()
+        self.undo_log.append((self.castling_flags, self.en_passant, self.en_passant_coordinates,
+                              self.fifty_draw_counter, self.zobrist_key, self.position_counts, self.position_score,
+                              self.white_king_location, self.black_king_location,
+                              self.pawn_moved_white, self.pawn_moved_black, self.white_castled, self.black_castled,
+                              self.repetition_punish[0], self.repetition_punish[1],
+                              self.draw_rule, self.checkmate, self.stalemate))
+        zobrist_key = self.zobrist_key ^ k.zobrist_black_to_move ^ self.get_castling_key(self.castling_flags)
+        zobrist_key ^= k.zobrist_pieces[move.piece_to_move][move.start_row][move.start_col]
+        position_score = self.position_score - k.piece_square_scores[move.piece_to_move][move.start_row][move.start_col]
+        if move.en_passant_move:
+            zobrist_key ^= k.zobrist_pieces[move.place_to_go][move.start_row][move.end_col]
+            position_score -= k.piece_square_scores[move.place_to_go][move.start_row][move.end_col]
+        elif move.place_to_go != k.empty:
+            zobrist_key ^= k.zobrist_pieces[move.place_to_go][move.end_row][move.end_col]
+            position_score -= k.piece_square_scores[move.place_to_go][move.end_row][move.end_col]
+        if self.en_passant != ():
+            zobrist_key ^= k.zobrist_en_passant[self.en_passant[1]]
+
         self.board[move.start_row][move.start_col] = k.empty
         self.board[move.end_row][move.end_col] = move.piece_to_move
-        self.position_score = 0
-
-        if move in self.move_log:
-            if self.white_moves:
-                self.repetition_punish[0] = True
-            else:
-                self.repetition_punish[1] = True
 
         self.move_log.append(move)
         if move.piece_to_move[1] == "P" or move.place_to_go[1] == "P":
-            self.fifty_draw_counter = 0
             if self.white_moves:
                 self.pawn_moved_white = True
             else:
                 self.pawn_moved_black = True
         else:
-            self.fifty_draw_counter += 1
             self.pawn_moved_white = False
             self.pawn_moved_black = False
 
+        # no position before a pawn move or a capture can occur again
+        irreversible = move.piece_to_move[1] == "P" or move.place_to_go != k.empty
+        if irreversible:
+            self.fifty_draw_counter = 0
+        else:
+            self.fifty_draw_counter += 1
+
         self.white_moves = not self.white_moves
 
         if move.place_to_go == "bB":
@@ -121,17 +210,52 @@ class GameState:
 
         if move.castle_move:
             if move.end_col - move.start_col == 2:
-                self.board[move.end_row][move.end_col - 1] = self.board[move.end_row][move.end_col + 1]
-                self.board[move.end_row][move.end_col + 1] = k.empty
+                rook_start_col, rook_end_col = move.end_col + 1, move.end_col - 1
             else:
-                self.board[move.end_row][move.end_col + 1] = self.board[move.end_row][move.end_col - 2]
-                self.board[move.end_row][move.end_col - 2] = k.empty
+                rook_start_col, rook_end_col = move.end_col - 2, move.end_col + 1
+            rook = self.board[move.end_row][rook_start_col]
+            self.board[move.end_row][rook_end_col] = rook
+            self.board[move.end_row][rook_start_col] = k.empty
+            zobrist_key ^= k.zobrist_pieces[rook][move.end_row][rook_start_col] ^ \
+                k.zobrist_pieces[rook][move.end_row][rook_end_col]
+            position_score += k.piece_square_scores[rook][move.end_row][rook_end_col] - \
+                k.piece_square_scores[rook][move.end_row][rook_start_col]
             if self.white_moves:
                 self.black_castled = True
             else:
                 self.white_castled = True
 
-        move_pgn = move.get_chess_notation()
+        piece_moved = self.board[move.end_row][move.end_col]
+        zobrist_key ^= k.zobrist_pieces[piece_moved][move.end_row][move.end_col]
+        self.position_score = position_score + k.piece_square_scores[piece_moved][move.end_row][move.end_col]
+        if self.en_passant != ():
+            zobrist_key ^= k.zobrist_en_passant[self.en_passant[1]]
+
+        if not search_mode:
+            self.append_pgn(move)
+
+        self.castling_flags = self.update_castle_flags(move)
+        self.zobrist_key = zobrist_key ^ self.get_castling_key(self.castling_flags)
+        if irreversible:
+            # the previous counts are kept in the undo record
+            self.position_counts = {}
+        repetition_counter = self.position_counts.get(self.zobrist_key, 0) + 1
+        self.position_counts[self.zobrist_key] = repetition_counter
+        if repetition_counter > 1:
+            self.repetition_punish[1 if self.white_moves else 0] = True
+        self._chessboard = None
+
+        if repetition_counter == 3 or self.fifty_draw_counter == 50:
+            self.draw_rule = True
+
+    def append_pgn(self, move):
+        """Appends the PGN notation of the
+           move that has just been made
+
+           Keyword arguments:
+           move -- Move object (start row, start col, end row, end col)
+        """
+        move_pgn = move.get_chess_notation(self)
 
         # if not self.white_moves:
         #     if move_pgn in k.developing_moves_white:
@@ -147,53 +271,45 @@ class GameState:
             move_pgn += "+"
 
         self.pgn_log.append(move_pgn)
-        self.en_passant_log.append(self.en_passant)
-
-        self.temp_castling_flags = self.update_castle_flags(move)
-        self.castling_log.append(self.temp_castling_flags)
-        self.castling_flags = self.temp_castling_flags
-        repetition_counter = self.update_board_fen()
-
-        if repetition_counter == 3 or self.fifty_draw_counter == 50:
-            self.draw_rule = True
 
     def undo_move(self):
         """Inverse make_move operation
            Sets the game state back to it's last
+           (the pieces are moved back, everything
+           else is restored from the undo record)
         """
         if len(self.move_log) != 0:
             move = self.move_log.pop()
-            self.pgn_log.pop()
-            self.board_history.pop()
-            if self.fifty_draw_counter != 0:
-                self.fifty_draw_counter -= 1
-            self.draw_rule = False
+            # moves made in search mode have no PGN notation
+            if len(self.pgn_log) > len(self.move_log):
+                self.pgn_log.pop()
+            # only the positions of the game path are kept (the search visits many more)
+            repetition_counter = self.position_counts[self.zobrist_key] - 1
+            if repetition_counter:
+                self.position_counts[self.zobrist_key] = repetition_counter
+            else:
+                del self.position_counts[self.zobrist_key]
+            (self.castling_flags, self.en_passant, self.en_passant_coordinates,
+             self.fifty_draw_counter, self.zobrist_key, self.position_counts, self.position_score,
+             self.white_king_location, self.black_king_location,
+             self.pawn_moved_white, self.pawn_moved_black, self.white_castled, self.black_castled,
+             self.repetition_punish[0], self.repetition_punish[1],
+             self.draw_rule, self.checkmate, self.stalemate) = self.undo_log.pop()
+            self._chessboard = None
             self.undo_flag = True
-            self.pawn_moved_black = False
-            self.pawn_moved_white = False
-            self.board[move.start_row][move.start_col] = move.piece_to_move
-            self.board[move.end_row][move.end_col] = move.place_to_go
             self.white_moves = not self.white_moves
 
-            if move.piece_to_move == "wK":
-                self.white_king_location = (move.start_row, move.start_col)
-            elif move.piece_to_move == "bK":
-                self.black_king_location = (move.start_row, move.start_col)
-
-            if move.place_to_go == "bB":
-                self.black_bishop_counter += 1
-            if move.place_to_go == "wB":
-                self.white_bishop_counter += 1
-
+            self.board[move.start_row][move.start_col] = move.piece_to_move
             if move.en_passant_move:
                 self.board[move.end_row][move.end_col] = k.empty
                 self.board[move.start_row][move.end_col] = move.place_to_go
+            else:
+                self.board[move.end_row][move.end_col] = move.place_to_go
 
-            self.en_passant_log.pop()
-            self.en_passant = self.en_passant_log[-1]
-
-            self.castling_log.pop()
-            self.castling_flags = self.castling_log[-1]
+            if move.place_to_go == "bB":
+                self.black_bishop_counter += 1
+            elif move.place_to_go == "wB":
+                self.white_bishop_counter += 1
 
             if move.castle_move:
                 if move.end_col - move.start_col == 2:
@@ -202,13 +318,41 @@ class GameState:
                 else:
                     self.board[move.end_row][move.end_col - 2] = self.board[move.end_row][move.end_col + 1]
                     self.board[move.end_row][move.end_col + 1] = k.empty
-                if move.castle_move:
-                    if self.white_moves:
-                        self.white_castled = False
-                    else:
-                        self.black_castled = False
-            self.checkmate = False
-            self.stalemate = False
+
+    def make_null_move(self):
+        """Passes the turn to the opponent without
+           moving a piece (null move pruning of the
+           search, the move log and the repetition
+           counts are not changed)
+        """
+        self.undo_log.append((self.en_passant, self.en_passant_coordinates, self.zobrist_key,
+                              self.checkmate, self.stalemate))
+        zobrist_key = self.zobrist_key ^ k.zobrist_black_to_move
+        if self.en_passant != ():
+            zobrist_key ^= k.zobrist_en_passant[self.en_passant[1]]
+        self.zobrist_key = zobrist_key
+        self.en_passant = ()
+        self.en_passant_coordinates = None
+        self.white_moves = not self.white_moves
+
+    def undo_null_move(self):
+        """Inverse make_null_move operation
+           (the flags set by the search of the
+           opponent moves are restored as well)
+        """
+        (self.en_passant, self.en_passant_coordinates, self.zobrist_key,
+         self.checkmate, self.stalemate) = self.undo_log.pop()
+        self.white_moves = not self.white_moves
+
+    def get_ambiguous_moves(self):
+        """Returns the destination squares of the
+           knights, rooks and queens of the current
+           player (used for the PGN notation of the
+           move that is about to be played)
+        """
+        ally = "w" if self.white_moves else "b"
+        return [[move.end_row, move.end_col, move.piece_to_move[1] + ally]
+                for move in self.get_valid_moves() if move.piece_to_move[1] in ("N", "R", "Q")]
 
     def update_castle_flags(self, move):
         """Sets the castle flags to false
@@ -217,6 +361,9 @@ class GameState:
            Keyword arguments:
            move -- Move object (start row, start col, end row, end col)
         """
+        if move.piece_to_move[1] != "K" and move.piece_to_move[1] != "R" and move.place_to_go[1] != "R":
+            # the castle flags are never changed in place, so they are shared
+            return self.castling_flags
         temp = CastleFlags(self.castling_flags.wks, self.castling_flags.bks,
                            self.castling_flags.wqs, self.castling_flags.bqs)
         if move.place_to_go == "wR":
@@ -250,17 +397,21 @@ class GameState:
                     temp.bks = False
         return temp
 
-    def get_all_possible_moves(self):
+    def get_all_possible_moves(self, captures=None):
         """Calls every move function in
            order to get every possible move
            (invalid ones too)
+
+           Keyword arguments:
+           captures -- True for captures (and promotions) only,
+                       False for quiet moves only, None for both
         """
         moves = []
         for row in range(len(self.board)):
             for col in range(len(self.board[row])):
                 piece_color = self.board[row][col][0]
                 if (piece_color == 'w' and self.white_moves) or (piece_color == 'b' and not self.white_moves):
-                    self.move_functions[self.board[row][col][1]](row, col, moves)
+                    self.move_functions[self.board[row][col][1]](row, col, moves, captures)
         return moves
 
     def king_helper(self):
@@ -271,63 +422,49 @@ class GameState:
         checked = False
         pins = []
         checks = []
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
 
         (start_row, start_col) = self.white_king_location if self.white_moves else self.black_king_location
         enemy = "b" if self.white_moves else "w"
         ally = "w" if self.white_moves else "b"
 
-        for i in range(len(directions)):
-            d = directions[i]
+        for i, ray in enumerate(k.ray_squares[start_row][start_col]):
+            d = k.king_offsets[i]
             eventual_pin = ()
-            for j in range(1, 8):
-                end_row = start_row + d[0] * j
-                end_col = start_col + d[1] * j
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                    end_piece = self.board[end_row][end_col]
-                    # the first piece between the king an an `eventual enemy` might be pinned
-                    if end_piece[0] == ally and end_piece[1] != "K":
+            for j, (end_row, end_col) in enumerate(ray, 1):
+                end_piece = self.board[end_row][end_col]
+                # the first piece between the king an an `eventual enemy` might be pinned
+                if end_piece[0] == ally and end_piece[1] != "K":
+                    if eventual_pin == ():
+                        eventual_pin = (end_row, end_col, d[0], d[1])
+                    else:
+                        # if the second piece is found, there's no pin
+                        break
+                elif end_piece[0] == enemy:
+                    # In case an enemy piece is found, there are 5 cases:
+                    # 1) orthogonal direction and piece is a rook (first 3 directions)
+                    # 2) diagonal direction and piece is a bishop
+                    # 3) pawn pin (can't go to a place defended by a pawn)
+                    # 4) every direction and piece is a queen
+                    # 5) kings (can't face each other)
+                    enemy_piece = end_piece[1]
+                    if (0 <= i <= 3 and enemy_piece == "R") or (4 <= i <= 7 and enemy_piece == "B") or (
+                            j == 1 and enemy_piece == "P" and (
+                            (enemy == "w" and 6 <= i <= 7) or (enemy == "b" and 4 <= i <= 5))) or (
+                            enemy_piece == "Q") or (j == 1 and enemy_piece == "K"):
                         if eventual_pin == ():
-                            eventual_pin = (end_row, end_col, d[0], d[1])
-                        else:
-                            # if the second piece is found, there's no pin
+                            checked = True
+                            checks.append((end_row, end_col, d[0], d[1]))
                             break
-                    elif end_piece[0] == enemy:
-                        # In case an enemy piece is found, there are 5 cases:
-                        # 1) orthogonal direction and piece is a rook (first 3 directions)
-                        # 2) diagonal direction and piece is a bishop
-                        # 3) pawn pin (can't go to a place defended by a pawn)
-                        # 4) every direction and piece is a queen
-                        # 5) kings (can't face each other)
-                        enemy_piece = end_piece[1]
-                        if (0 <= i <= 3 and enemy_piece == "R") or (4 <= i <= 7 and enemy_piece == "B") or (
-                                j == 1 and enemy_piece == "P" and (
-                                (enemy == "w" and 6 <= i <= 7 and not k.flip) or
-                                (enemy == "b" and 4 <= i <= 5 and not k.flip) or
-                                (enemy == "b" and 6 <= i <= 7 and k.flip) or
-                                (enemy == "w" and 4 <= i <= 5 and k.flip))) or (
-                                enemy_piece == "Q") or (j == 1 and enemy_piece == "K"):
-                            if eventual_pin == ():
-                                checked = True
-                                checks.append((end_row, end_col, d[0], d[1]))
-                                break
-                            else:
-                                pins.append(eventual_pin)
-                                break
                         else:
+                            pins.append(eventual_pin)
                             break
-                else:
-                    break
+                    else:
+                        break
 
-        knight_moves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
-        for move in knight_moves:
-            end_row = start_row + move[0]
-            end_col = start_col + move[1]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] == enemy and end_piece[1] == "N":
-                    checked = True
-                    checks.append((end_row, end_col, move[0], move[1]))
+        for end_row, end_col in k.knight_squares[start_row][start_col]:
+            if self.board[end_row][end_col] == enemy + "N":
+                checked = True
+                checks.append((end_row, end_col, end_row - start_row, end_col - start_col))
         return checked, pins, checks
 
     def get_valid_moves(self):
@@ -335,10 +472,6 @@ class GameState:
            Remove illegal moves and get castle moves (if any)
            Set state to checkmate / stalemate if no valid moves
         """
-        temp_castle_rights = CastleFlags(self.castling_flags.wks, self.castling_flags.bks,
-                                         self.castling_flags.wqs, self.castling_flags.bqs)
-
-        self.eventual_ambiguous_moves = []
         moves = []
         self.checked, self.pins, self.checks = self.king_helper()
 
@@ -346,27 +479,8 @@ class GameState:
 
         if self.checked:
             if len(self.checks) == 1:
-                moves = self.get_all_possible_moves()
-                check = self.checks[0]
-                check_row = check[0]
-                check_col = check[1]
-                piece_checking = self.board[check_row][check_col]
-                valid_squares = []
-                if piece_checking[1] == "N":
-                    valid_squares = [(check_row, check_col)]
-                else:
-                    for i in range(1, 8):
-                        valid_square = (king_row + check[2] * i, king_col + check[3] * i)
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[1] == check_col:
-                            break
-
-                for i in range(len(moves)-1, -1, -1):
-                    if moves[i].piece_to_move[1] != "K":
-                        if not (moves[i].end_row, moves[i].end_col) in valid_squares:
-                            moves.remove(moves[i])
-            else:
-                self.get_king_moves(king_row, king_col, moves)
+                self.get_evasion_moves(king_row, king_col, moves)
+            self.get_king_moves(king_row, king_col, moves)
         else:
             moves = self.get_all_possible_moves()
             if not k.imported:
@@ -384,10 +498,341 @@ class GameState:
             self.checkmate = False
             self.stalemate = False
 
-        self.castling_flags = temp_castle_rights
         self.valid_moves_counter = len(moves)
         return moves
 
+    def get_evasion_moves(self, king_row, king_col, moves):
+        """Appends the moves which capture the only checking
+           piece or block its check ray (king moves excluded)
+           Pinned pieces can't do either, so they are skipped
+
+           Keyword arguments:
+           king_row -- (0-7)
+           king_col -- (0-7)
+           moves    -- current valid moves
+        """
+        check_row, check_col, check_row_direction, check_col_direction = self.checks[0]
+        if self.board[check_row][check_col][1] == "N":
+            target_squares = [(check_row, check_col)]
+        else:
+            target_squares = []
+            for i in range(1, 8):
+                target_square = (king_row + check_row_direction * i, king_col + check_col_direction * i)
+                target_squares.append(target_square)
+                if target_square == (check_row, check_col):
+                    break
+
+        pinned_squares = {(pin[0], pin[1]) for pin in self.pins}
+        ally = "w" if self.white_moves else "b"
+        increment = -1 if self.white_moves else 1
+        start_pos = 6 if self.white_moves else 1
+        ally_pawn = ally + "P"
+
+        for (row, col) in target_squares:
+            capture = self.board[row][col] != k.empty
+
+            # pawns: pushes block, diagonal moves capture
+            pawn_row = row - increment
+            if 0 <= pawn_row < 8:
+                if capture:
+                    for pawn_row, pawn_col in k.pawn_attack_squares[-increment][row][col]:
+                        if self.board[pawn_row][pawn_col] == ally_pawn and \
+                                (pawn_row, pawn_col) not in pinned_squares:
+                            k.insert_move_ordering(moves, Move((pawn_row, pawn_col), (row, col), self))
+                elif self.board[pawn_row][col] == ally_pawn:
+                    if (pawn_row, col) not in pinned_squares:
+                        k.insert_move_ordering(moves, Move((pawn_row, col), (row, col), self))
+                elif self.board[pawn_row][col] == k.empty and pawn_row - increment == start_pos and \
+                        self.board[start_pos][col] == ally_pawn and (start_pos, col) not in pinned_squares:
+                    k.insert_move_ordering(moves, Move((start_pos, col), (row, col), self))
+
+            # knights
+            for start_row, start_col in k.knight_squares[row][col]:
+                if self.board[start_row][start_col] == ally + "N" and (start_row, start_col) not in pinned_squares:
+                    k.insert_move_ordering(moves, Move((start_row, start_col), (row, col), self))
+
+            # sliding pieces: the first piece on every ray
+            for i, ray in enumerate(k.ray_squares[row][col]):
+                sliders = "RQ" if i < 4 else "BQ"
+                for start_row, start_col in ray:
+                    start_piece = self.board[start_row][start_col]
+                    if start_piece != k.empty:
+                        if start_piece[0] == ally and start_piece[1] in sliders and \
+                                (start_row, start_col) not in pinned_squares:
+                            k.insert_move_ordering(moves, Move((start_row, start_col), (row, col), self))
+                        break
+
+        # en passant capture of a checking pawn which has just moved two squares
+        if self.en_passant != () and self.en_passant == (check_row + increment, check_col):
+            for pawn_col in (check_col - 1, check_col + 1):
+                if 0 <= pawn_col < 8 and self.board[check_row][pawn_col] == ally_pawn and \
+                        (check_row, pawn_col) not in pinned_squares:
+                    pawn_moves = []
+                    self.get_pawn_moves(check_row, pawn_col, pawn_moves, captures=True)
+                    for move in pawn_moves:
+                        if move.en_passant_move:
+                            k.insert_move_ordering(moves, move)
+
+    def get_staged_moves(self, killer_moves=(), history=None):
+        """Yields the valid moves in stages: winning and
+           equal captures (and promotions) in MVV-LVA order,
+           then the killer moves, then the losing captures
+           and finally the remaining quiet moves
+           Quiet moves are generated only if the search
+           asks for them (no cutoff on the captures)
+           Sets state to checkmate / stalemate if no valid moves
+
+           Keyword arguments:
+           killer_moves -- quiet moves that caused cutoffs at the same depth
+           history      -- cutoff score of every quiet move id (quiet moves sorted by it if given)
+        """
+        checked, pins, checks = self.king_helper()
+        if checked:
+            moves = self.get_valid_moves()
+            moves.sort(key=lambda evasion: evasion.place_to_go != k.empty, reverse=True)
+            yield from moves
+            return
+
+        self.checkmate = self.stalemate = False
+        self.checked, self.pins, self.checks = checked, pins, checks
+        captures, losing_captures = self.get_ordered_captures()
+        yield from captures
+
+        # the search made other moves between the yields, so the pins are restored
+        killers_found = []
+        for killer in killer_moves:
+            self.checked, self.pins, self.checks = checked, pins, checks
+            if killer is not None and self.is_valid_quiet_move(killer):
+                killers_found.append(killer)
+                yield killer
+
+        # the fixed depth search often needs them to win back material, so they come before the quiet moves
+        yield from losing_captures
+
+        self.checked, self.pins, self.checks = checked, pins, checks
+        quiet_moves = self.get_all_possible_moves(captures=False)
+        if not k.imported:
+            (king_row, king_col) = self.white_king_location if self.white_moves else self.black_king_location
+            self.get_castle_moves(king_row, king_col, quiet_moves)
+        if history is not None:
+            quiet_moves.sort(key=lambda move: history[move.move_id], reverse=True)
+
+        for move in quiet_moves:
+            if move not in killers_found:
+                yield move
+
+        if len(captures) == 0 and len(losing_captures) == 0 and len(quiet_moves) == 0:
+            self.checkmate = False
+            self.stalemate = True
+
+    def get_move_from_id(self, move_id):
+        """Returns the valid move with the given
+           id (e.g. the best move stored in the
+           transposition table), None if there's
+           no such move in the current position
+
+           Keyword arguments:
+           move_id -- start and end squares packed in one int (Move.move_id)
+        """
+        self.checked, self.pins, self.checks = self.king_helper()
+        if self.checked:
+            moves = self.get_valid_moves()
+        else:
+            (row, col) = divmod(move_id >> 6, 8)
+            piece = self.board[row][col]
+            if piece[0] != ("w" if self.white_moves else "b"):
+                return None
+            moves = []
+            self.move_functions[piece[1]](row, col, moves)
+            if piece[1] == "K" and not k.imported:
+                self.get_castle_moves(row, col, moves)
+        for move in moves:
+            if move.move_id == move_id:
+                return move
+        return None
+
+    def get_ordered_captures(self):
+        """Returns the valid captures (and promotions)
+           in MVV-LVA order, split into winning / equal
+           captures and losing captures (negative static
+           exchange evaluation, pins must be calculated)
+        """
+        captures = self.get_all_possible_moves(captures=True)
+        captures.sort(key=lambda capture: capture.move_score, reverse=True)
+        good_captures = []
+        losing_captures = []
+        for capture in captures:
+            # taking a piece worth at least the attacker can't lose material
+            if k.exchange_scores[capture.piece_to_move[1]] > k.exchange_scores[capture.place_to_go[1]] and \
+                    self.static_exchange_evaluation(capture) < 0:
+                losing_captures.append(capture)
+            else:
+                good_captures.append(capture)
+        return good_captures, losing_captures
+
+    def static_exchange_evaluation(self, move):
+        """Returns the material won (centipawns) by
+           the move if both players keep capturing on
+           its end square with their least valuable
+           piece while it pays off (no move is made,
+           the x-ray attackers behind the capturing
+           pieces are included, pins are ignored)
+
+           Keyword arguments:
+           move -- Move object (start row, start col, end row, end col)
+        """
+        values = k.exchange_scores
+        board = self.board
+        row, col = move.end_row, move.end_col
+        vacated = ((move.start_row, move.start_col), (move.start_row, move.end_col) if move.en_passant_move else None)
+
+        # the pieces on every ray from the end square (nearest first) and the knights around it
+        rays = [[(board[end_row][end_col], distance) for distance, (end_row, end_col) in enumerate(ray, 1)
+                 if board[end_row][end_col] != k.empty and (end_row, end_col) not in vacated]
+                for ray in k.ray_squares[row][col]]
+        knights = [board[end_row][end_col][0] for end_row, end_col in k.knight_squares[row][col]
+                   if board[end_row][end_col][1] == "N" and (end_row, end_col) not in vacated]
+        # rays (king_offsets indices) pointing to the pawns that attack the end square
+        pawn_directions = {"w": (6, 7), "b": (4, 5)}
+
+        gains = [values[move.place_to_go[1]]]
+        piece_on_square = move.piece_to_move[1]
+        if move.is_pawn_promotion:
+            gains[0] += values["Q"] - values["P"]
+            piece_on_square = "Q"
+        side = "b" if move.piece_to_move[0] == "w" else "w"
+        while True:
+            attacker = None
+            attacker_ray = None
+            if side in knights:
+                attacker = "N"
+            for i, ray in enumerate(rays):
+                if not ray:
+                    continue
+                piece, distance = ray[0]
+                if piece[0] == side and (piece[1] == "Q" or piece[1] == ("R" if i < 4 else "B") or
+                                         (distance == 1 and (piece[1] == "K" or
+                                                             (piece[1] == "P" and i in pawn_directions[side])))):
+                    if attacker is None or values[piece[1]] < values[attacker]:
+                        attacker = piece[1]
+                        attacker_ray = i
+            if attacker is None:
+                break
+            # a king capturing a defended piece scores so low that it is never chosen
+            gains.append(values[piece_on_square] - gains[-1])
+            piece_on_square = attacker
+            if attacker_ray is None:
+                knights.remove(side)
+            else:
+                # uncovers the x-ray attacker behind it
+                rays[attacker_ray].pop(0)
+            side = "b" if side == "w" else "w"
+
+        # every player may stop capturing, so the scores are resolved from the last capture
+        while len(gains) > 1:
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    def is_valid_quiet_move(self, move):
+        """Returns true if the given quiet move
+           (e.g. a killer move from another position)
+           is valid in the current position
+           (pins must be calculated)
+
+           Keyword arguments:
+           move -- Move object (start row, start col, end row, end col)
+        """
+        if move.castle_move or move.place_to_go != k.empty or \
+                self.board[move.start_row][move.start_col] != move.piece_to_move or \
+                self.board[move.end_row][move.end_col] != k.empty or \
+                move.piece_to_move[0] != ("w" if self.white_moves else "b"):
+            return False
+        piece_moves = []
+        self.move_functions[move.piece_to_move[1]](move.start_row, move.start_col, piece_moves, False)
+        return move in piece_moves
+
+    def get_mobility(self):
+        """Returns the number of valid moves of every
+           piece type of the current player (castle moves
+           are counted as king moves) without creating
+           the Move objects (in check the evasions are generated)
+        """
+        mobility = {"P": 0, "N": 0, "B": 0, "R": 0, "Q": 0, "K": 0}
+        self.checked, self.pins, self.checks = self.king_helper()
+        if self.checked:
+            for move in self.get_valid_moves():
+                mobility[move.piece_to_move[1]] += 1
+            return mobility
+
+        board = self.board
+        ally, enemy = ("w", "b") if self.white_moves else ("b", "w")
+        increment = -1 if self.white_moves else 1
+        start_pos = 6 if self.white_moves else 1
+        pin_directions = {(pin[0], pin[1]): (pin[2], pin[3]) for pin in self.pins}
+        slider_directions = {"B": range(4, 8), "R": range(4), "Q": range(8)}
+
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != ally:
+                    continue
+                piece_type = piece[1]
+                pin_direction = pin_directions.get((row, col))
+                count = 0
+                if piece_type == "P":
+                    if board[row + increment][col] == k.empty and \
+                            (pin_direction is None or pin_direction[1] == 0):
+                        count += 1
+                        if row == start_pos and board[row + 2 * increment][col] == k.empty:
+                            count += 1
+                    for end_row, end_col in k.pawn_attack_squares[increment][row][col]:
+                        if (end_row, end_col) == self.en_passant:
+                            # the en passant capture may uncover a check along the rank
+                            pawn_moves = []
+                            self.get_pawn_moves(row, col, pawn_moves, captures=True)
+                            count += sum(move.en_passant_move for move in pawn_moves)
+                        elif board[end_row][end_col][0] == enemy and \
+                                (pin_direction is None or pin_direction == (increment, end_col - col)):
+                            count += 1
+                elif piece_type == "N":
+                    if pin_direction is None:
+                        for end_row, end_col in k.knight_squares[row][col]:
+                            if board[end_row][end_col][0] != ally:
+                                count += 1
+                elif piece_type == "K":
+                    # not in check, so the king doesn't hide an attack on the squares it goes to
+                    for end_row, end_col in k.king_squares[row][col]:
+                        if board[end_row][end_col][0] != ally and not self.square_attacked(end_row, end_col):
+                            count += 1
+                    if not k.imported:
+                        castle_moves = []
+                        self.get_castle_moves(row, col, castle_moves)
+                        count += len(castle_moves)
+                else:
+                    rays = k.ray_squares[row][col]
+                    for i in slider_directions[piece_type]:
+                        d = k.king_offsets[i]
+                        if pin_direction is not None and pin_direction != d and pin_direction != (-d[0], -d[1]):
+                            continue
+                        for end_row, end_col in rays[i]:
+                            end_piece = board[end_row][end_col]
+                            if end_piece == k.empty:
+                                count += 1
+                            else:
+                                if end_piece[0] == enemy:
+                                    count += 1
+                                break
+                mobility[piece_type] += count
+        return mobility
+
+    def count_valid_moves(self):
+        """Returns the number of valid moves
+           (same as len(get_valid_moves()) but
+           without creating the Move objects)
+        """
+        return sum(self.get_mobility().values())
+
     def in_check(self):
         """Return true if the king of
            the current play is
@@ -398,32 +843,70 @@ class GameState:
         else:
             return self.square_attacked(self.black_king_location[0], self.black_king_location[1])
 
+    def has_non_pawn_material(self):
+        """Return true if the current player has
+           a piece besides the king and the pawns
+           (without one a null move may hide a
+           zugzwang)
+        """
+        ally = "w" if self.white_moves else "b"
+        for row in self.board:
+            for square in row:
+                if square[0] == ally and square[1] in ("N", "B", "R", "Q"):
+                    return True
+        return False
+
     def square_attacked(self, row, col):
         """Return true if the square
            with the coordinates (row, col)
            is attacked by any enemy piece
+           (looks outward from the square along
+           rays, knight jumps, pawn diagonals and
+           king offsets, no move is generated)
 
            Keyword arguments:
            row -- (0-7)
            col -- (0-7)
         """
-        self.white_moves = not self.white_moves
-        opponent_moves = self.get_all_possible_moves()
-        self.white_moves = not self.white_moves
-        for move in opponent_moves:
-            if move.end_row == row and move.end_col == col:
+        enemy = "b" if self.white_moves else "w"
+        board = self.board
+
+        # enemy pawns attack diagonally towards the square (one row behind it)
+        increment = 1 if enemy == "w" else -1
+        for end_row, end_col in k.pawn_attack_squares[increment][row][col]:
+            if board[end_row][end_col] == enemy + "P":
                 return True
+
+        for end_row, end_col in k.knight_squares[row][col]:
+            if board[end_row][end_col] == enemy + "N":
+                return True
+
+        for end_row, end_col in k.king_squares[row][col]:
+            if board[end_row][end_col] == enemy + "K":
+                return True
+
+        # sliding pieces: the first piece found on every ray decides
+        for i, ray in enumerate(k.ray_squares[row][col]):
+            sliders = ("R", "Q") if i < 4 else ("B", "Q")
+            for end_row, end_col in ray:
+                end_piece = board[end_row][end_col]
+                if end_piece != k.empty:
+                    if end_piece[0] == enemy and end_piece[1] in sliders:
+                        return True
+                    break
         return False
 
-    def get_pawn_moves(self, row, col, moves):
+    def get_pawn_moves(self, row, col, moves, captures=None):
         """Appends the pawn moves to
            the final valid moves list
            removes eventual-pinned pieces
 
            Keyword arguments:
-           row   -- (0-7)
-           col   -- (0-7)
-           moves -- current valid moves
+           row      -- (0-7)
+           col      -- (0-7)
+           moves    -- current valid moves
+           captures -- True for captures (and promotions) only,
+                       False for quiet moves only, None for both
         """
         pinned = False
         pin_direction = ()
@@ -432,21 +915,24 @@ class GameState:
             if self.pins[i][0] == row and self.pins[i][1] == col:
                 pinned = True
                 pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
                 break
 
         king_row, king_col = self.white_king_location if self.white_moves else self.black_king_location
-        increment = -1 if (self.white_moves and not k.flip) or\
-                          (not self.white_moves and k.flip) else 1
-        start_pos = 6 if (self.white_moves and not k.flip) or (not self.white_moves and k.flip) else 1
+        increment = -1 if self.white_moves else 1
+        start_pos = 6 if self.white_moves else 1
         enemy = "b" if self.white_moves else "w"
 
         if self.board[row + increment][col] == k.empty:
-            if not pinned or pin_direction == (increment, 0):
-                k.insert_move_ordering(moves, Move((row, col), (row + increment, col), self))
-                if row == start_pos and self.board[row + 2 * increment][col] == k.empty:
+            if not pinned or pin_direction == (increment, 0) or pin_direction == (-increment, 0):
+                promotion = row + increment == 0 or row + increment == 7
+                if captures is None or captures == promotion:
+                    k.insert_move_ordering(moves, Move((row, col), (row + increment, col), self))
+                if captures is not True and row == start_pos and self.board[row + 2 * increment][col] == k.empty:
                     k.insert_move_ordering(moves, Move((row, col), (row + 2 * increment, col), self))
 
+        if captures is False:
+            return
+
         if col-1 >= 0:
             if not pinned or pin_direction == (increment, -1):
                 if self.board[row + increment][col - 1][0] == enemy:
@@ -467,8 +953,10 @@ class GameState:
                             square = self.board[row][i]
                             if square[0] == enemy and (square[1] == "R" or square[1] == "Q"):
                                 attack_piece = True
+                                break
                             elif square != k.empty:
                                 block_piece = True
+                                break
                     if not attack_piece or block_piece:
                         k.insert_move_ordering(moves,
                                                Move((row, col), (row + increment, col - 1), self, en_passant=True))
@@ -493,52 +981,45 @@ class GameState:
                             square = self.board[row][i]
                             if square[0] == enemy and (square[1] == "R" or square[1] == "Q"):
                                 attack_piece = True
+                                break
                             elif square != k.empty:
                                 block_piece = True
+                                break
                     if not attack_piece or block_piece:
                         k.insert_move_ordering(moves,
                                                Move((row, col), (row + increment, col + 1), self, en_passant=True))
 
-    def get_knight_moves(self, row, col, moves):
+    def get_knight_moves(self, row, col, moves, captures=None):
         """Appends the knight moves to
            the final valid moves list
            removes eventual-pinned pieces
 
            Keyword arguments:
-           row   -- (0-7)
-           col   -- (0-7)
-           moves -- current valid moves
+           row      -- (0-7)
+           col      -- (0-7)
+           moves    -- current valid moves
+           captures -- True for captures only, False for quiet moves only, None for both
         """
-        pinned = False
+        for pin in self.pins:
+            if pin[0] == row and pin[1] == col:
+                return
 
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                pinned = True
-                self.pins.remove(self.pins[i])
-                break
-
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
         ally = "w" if self.white_moves else "b"
-        for move in knight_moves:
-            end_row = row + move[0]
-            end_col = col + move[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                if not pinned:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece[0] != ally:
-                        knight_move = Move((row, col), (end_row, end_col), self)
-                        k.insert_move_ordering(moves, knight_move)
-                        self.eventual_ambiguous_moves.append([end_row, end_col, f"N{'w' if self.white_moves else 'b'}"])
-
-    def get_bishop_moves(self, row, col, moves):
+        for end_row, end_col in k.knight_squares[row][col]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] != ally and (captures is None or captures == (end_piece != k.empty)):
+                k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
+
+    def get_bishop_moves(self, row, col, moves, captures=None):
         """Appends the bishop moves to
            the final valid moves list
            removes eventual-pinned pieces
 
            Keyword arguments:
-           row   -- (0-7)
-           col   -- (0-7)
-           moves -- current valid moves
+           row      -- (0-7)
+           col      -- (0-7)
+           moves    -- current valid moves
+           captures -- True for captures only, False for quiet moves only, None for both
         """
         pinned = False
         pin_direction = ()
@@ -547,44 +1028,36 @@ class GameState:
             if self.pins[i][0] == row and self.pins[i][1] == col:
                 pinned = True
                 pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
                 break
 
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+        rays = k.ray_squares[row][col]
         enemy = "b" if self.white_moves else "w"
-        ally = "w" if self.white_moves else "b"
-        for d in directions:
-            for i in range(1, 8):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if not pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "xx":
-                            k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
-                            if self.board[row][col][1] == 'Q':
-                                self.eventual_ambiguous_moves.append([end_row, end_col,
-                                                                      str(self.board[row][col][1] + ally)])
-                        elif end_piece[0] == enemy:
-                            k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
-                            if self.board[row][col][1] == 'Q':
-                                self.eventual_ambiguous_moves.append([end_row, end_col,
-                                                                      str(self.board[row][col][1] + ally)])
-                            break
-                        else:
-                            break
+        for i in range(4, 8):
+            d = k.king_offsets[i]
+            if pinned and pin_direction != d and pin_direction != (-d[0], -d[1]):
+                continue
+            for end_row, end_col in rays[i]:
+                end_piece = self.board[end_row][end_col]
+                if end_piece == k.empty:
+                    if captures is not True:
+                        k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
+                elif end_piece[0] == enemy:
+                    if captures is not False:
+                        k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
+                    break
                 else:
                     break
 
-    def get_rook_moves(self, row, col, moves):
+    def get_rook_moves(self, row, col, moves, captures=None):
         """Appends the rook moves to
            the final valid moves list
            removes eventual-pinned pieces
 
            Keyword arguments:
-           row   -- (0-7)
-           col   -- (0-7)
-           moves -- current valid moves
+           row      -- (0-7)
+           col      -- (0-7)
+           moves    -- current valid moves
+           captures -- True for captures only, False for quiet moves only, None for both
         """
         pinned = False
         pin_direction = ()
@@ -593,81 +1066,70 @@ class GameState:
             if self.pins[i][0] == row and self.pins[i][1] == col:
                 pinned = True
                 pin_direction = (self.pins[i][2], self.pins[i][3])
-                if self.board[row][col][1] != "Q":
-                    self.pins.remove(self.pins[i])
                 break
 
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
+        rays = k.ray_squares[row][col]
         enemy = "b" if self.white_moves else "w"
-        ally = "w" if self.white_moves else "b"
-        for d in directions:
-            for i in range(1, 8):
-                end_row = row + d[0] * i
-                end_col = col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    if not pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == k.empty:
-                            k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
-                            self.eventual_ambiguous_moves.append([end_row, end_col,
-                                                                  str(self.board[row][col][1] + ally)])
-                        elif end_piece[0] == enemy:
-                            k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
-                            self.eventual_ambiguous_moves.append([end_row, end_col,
-                                                                  str(self.board[row][col][1] + ally)])
-                            break
-                        else:
-                            break
+        for i in range(4):
+            d = k.king_offsets[i]
+            if pinned and pin_direction != d and pin_direction != (-d[0], -d[1]):
+                continue
+            for end_row, end_col in rays[i]:
+                end_piece = self.board[end_row][end_col]
+                if end_piece == k.empty:
+                    if captures is not True:
+                        k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
+                elif end_piece[0] == enemy:
+                    if captures is not False:
+                        k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
+                    break
                 else:
                     break
 
-    def get_queen_moves(self, row, col, moves):
+    def get_queen_moves(self, row, col, moves, captures=None):
         """Appends the queen moves to
            the final valid moves list
            removes eventual-pinned pieces
            queen moves = bishop moves + rook moves
 
            Keyword arguments:
-           row   -- (0-7)
-           col   -- (0-7)
-           moves -- current valid moves
+           row      -- (0-7)
+           col      -- (0-7)
+           moves    -- current valid moves
+           captures -- True for captures only, False for quiet moves only, None for both
         """
-        self.get_rook_moves(row, col, moves)
-        self.get_bishop_moves(row, col, moves)
+        self.get_rook_moves(row, col, moves, captures)
+        self.get_bishop_moves(row, col, moves, captures)
 
-    def get_king_moves(self, row, col, moves):
+    def get_king_moves(self, row, col, moves, captures=None):
         """Appends the king moves to
            the final valid moves list
            removes eventual-pinned piece
            and updates the king location
 
            Keyword arguments:
-           row   -- (0-7)
-           col   -- (0-7)
-           moves -- current valid moves
+           row      -- (0-7)
+           col      -- (0-7)
+           moves    -- current valid moves
+           captures -- True for captures only, False for quiet moves only, None for both
         """
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
         ally = "w" if self.white_moves else "b"
-        for i in range(8):
-            end_row = row + row_moves[i]
-            end_col = col + col_moves[i]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally:
-                    if ally == "w":
-                        self.white_king_location = (end_row, end_col)
-                    else:
-                        self.black_king_location = (end_row, end_col)
+        for end_row, end_col in k.king_squares[row][col]:
+            end_piece = self.board[end_row][end_col]
+            if end_piece[0] != ally and (captures is None or captures == (end_piece != k.empty)):
+                if ally == "w":
+                    self.white_king_location = (end_row, end_col)
+                else:
+                    self.black_king_location = (end_row, end_col)
 
-                    checked, pins, checks = self.king_helper()
-                    if not checked:
-                        k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
+                checked, pins, checks = self.king_helper()
+                if not checked:
+                    k.insert_move_ordering(moves, Move((row, col), (end_row, end_col), self))
 
-                    if ally == "w":
-                        self.white_king_location = (row, col)
-                    else:
-                        self.black_king_location = (row, col)
+                if ally == "w":
+                    self.white_king_location = (row, col)
+                else:
+                    self.black_king_location = (row, col)
 
     def get_castle_moves(self, row, col, moves):
         """Returns valid castle moves
@@ -710,11 +1172,75 @@ class GameState:
             if not self.square_attacked(row, col - 1) and not self.square_attacked(row, col - 2):
                 k.insert_move_ordering(moves, Move((row, col), (row, col - 2), self, castle=True))
 
-    def update_board_fen(self):
-        """Calculates the new FEN notation
-           after a move is made and also
-           computes some preciuous information
-           for the evaluation function
+    def refresh_position_state(self):
+        """Recomputes the Zobrist key and the
+           repetition history from scratch
+           (used whenever the board is set
+           without calling make_move)
+        """
+        zobrist_key = k.zobrist_black_to_move if not self.white_moves else 0
+        for row in range(len(self.board)):
+            for col in range(len(self.board[row])):
+                piece = self.board[row][col]
+                if piece != k.empty:
+                    zobrist_key ^= k.zobrist_pieces[piece][row][col]
+        zobrist_key ^= self.get_castling_key(self.castling_flags)
+        if self.en_passant != ():
+            zobrist_key ^= k.zobrist_en_passant[self.en_passant[1]]
+
+        self.zobrist_key = zobrist_key
+        self.position_counts = {zobrist_key: 1}
+        self._chessboard = None
+        self.update_position_score()
+
+    @staticmethod
+    def get_castling_key(castling_flags):
+        """Returns the Zobrist key part
+           given by the castling rights
+
+           Keyword arguments:
+           castling_flags -- CastleFlags object
+        """
+        castling_key = 0
+        if castling_flags.wks:
+            castling_key ^= k.zobrist_castling["wks"]
+        if castling_flags.bks:
+            castling_key ^= k.zobrist_castling["bks"]
+        if castling_flags.wqs:
+            castling_key ^= k.zobrist_castling["wqs"]
+        if castling_flags.bqs:
+            castling_key ^= k.zobrist_castling["bqs"]
+        return castling_key
+
+    def update_position_score(self):
+        """Computes the material and piece
+           position score of the current board
+           from scratch (make_move and undo_move
+           keep it up to date afterwards)
+        """
+        self.position_score = 0
+        for row in range(len(self.board)):
+            for col in range(len(self.board[row])):
+                piece = self.board[row][col]
+                if piece != k.empty:
+                    self.position_score += k.piece_square_scores[piece][row][col]
+
+    @property
+    def chessboard(self):
+        """Returns a python-chess mirror of the
+           current game state (used by MCTS)
+           built only when it is asked for and
+           cached until the next make / undo
+        """
+        if self._chessboard is None:
+            self._chessboard = chess.Board(self.fen_notation)
+        return self._chessboard
+
+    @property
+    def fen_notation(self):
+        """Calculates the FEN notation
+           of the current game state
+           (only when it is asked for)
         """
         identifier = ""
         for row in range(len(self.board)):
@@ -724,11 +1250,6 @@ class GameState:
                 if piece == k.empty:
                     counter += 1
                 else:
-                    piece_position_score = k.piece_position_scores[piece][row][col]
-                    if piece[0] == "w":
-                        self.position_score += k.piece_score[piece[1]] + piece_position_score * 0.05
-                    elif piece[0] == "b":
-                        self.position_score -= k.piece_score[piece[1]] + piece_position_score * 0.05
                     letter = piece[1].lower() if piece[0] == "b" else piece[1].upper()
                     if counter == 0:
                         identifier += letter
@@ -739,8 +1260,6 @@ class GameState:
                 identifier += str(counter)
             if row != 7:
                 identifier += '/'
-        history_identifier = identifier
-        self.board_history.append(history_identifier)
 
         identifier += ' w ' if self.white_moves else ' b '
         castling_symbols = ""
@@ -757,22 +1276,25 @@ class GameState:
         else:
             identifier += "- "
 
-        if self.en_passant_coordinates is not None:
-            identifier += self.en_passant_coordinates + " "
+        if self.en_passant != ():
+            identifier += k.get_file_rank_notation(self.en_passant[0], self.en_passant[1]) + " "
         else:
             identifier += "- "
 
         identifier += str(self.fifty_draw_counter) + " "
-        identifier += str(len(self.pgn_log) // 2 + 1)
-        self.fen_notation = identifier
-        self.chessboard = chess.Board(self.fen_notation)
-        return self.board_history.count(history_identifier)
+        identifier += str(len(self.move_log) // 2 + 1)
+        return identifier
 
 
 class Move:
     """Stores every information that
        a specific move needs
+       (slotted, without a reference to the game state,
+       so that millions of them stay cheap during search)
     """
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_to_move", "place_to_go",
+                 "is_pawn_promotion", "en_passant_move", "castle_move", "move_id")
+
     def __init__(self, start_square, end_square, state, en_passant=False, castle=False):
         self.start_row = start_square[0]
         self.start_col = start_square[1]
@@ -783,26 +1305,26 @@ class Move:
         self.is_pawn_promotion = (self.piece_to_move == "wP" and self.end_row == 0) or\
                                  (self.piece_to_move == "bP" and self.end_row == 7)
         self.en_passant_move = en_passant
-        self.state = state
         self.castle_move = castle
         if self.en_passant_move:
             self.place_to_go = "wP" if self.piece_to_move == "bP" else "bP"
-        self.move_score = self.calculate_mvvlva()
-        self.id = str(self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col)
-
-    def calculate_mvvlva(self):
-        """Computes the Most Valuable Victim
-           Least Valuable Attacker score
-           for move ordering
+        # start and end squares packed in one int (6 bits each)
+        self.move_id = (self.start_row * 8 + self.start_col) << 6 | (self.end_row * 8 + self.end_col)
+
+    @property
+    def move_score(self):
+        """Most Valuable Victim - Least Valuable
+           Attacker score for move ordering
+           (computed only when it is asked for)
         """
-        mvv_lva_scores = {"Q": 500, "R": 400, "B": 350, "N": 300, "P": 100, "x": 0, "K": 200}
-        victim_score = mvv_lva_scores[self.state.board[self.end_row][self.end_col][1]]
-        attacker_score = mvv_lva_scores[self.state.board[self.start_row][self.start_col][1]] // 100
-        return victim_score + 6 - attacker_score
+        return k.mvv_lva_scores[self.place_to_go[1]] + 6 - k.mvv_lva_scores[self.piece_to_move[1]] // 100
 
-    def get_chess_notation(self):
+    def get_chess_notation(self, state):
         """Maps the current move to a
            portable game notation (PGN)
+
+           Keyword arguments:
+           state -- information about chess game (after the move is made)
         """
         move_string = ""
         king_moved = False
@@ -814,27 +1336,27 @@ class Move:
                 move_string = "0-0"
             king_moved = True
 
-        enemy = "b" if self.state.white_moves else "w"
-        piece_moved = self.state.board[self.end_row][self.end_col][1]
-        piece_notation_amb = str(self.state.board[self.end_row][self.end_col][1] + enemy)
+        enemy = "b" if state.white_moves else "w"
+        piece_moved = state.board[self.end_row][self.end_col][1]
+        piece_notation_amb = str(state.board[self.end_row][self.end_col][1] + enemy)
         count_col = 0
         knight_special_case = None
         rook_special_case = None
         ambiguous = False
 
-        if self.state.last_ambiguous_moves.count([self.end_row, self.end_col, piece_notation_amb]) >= 2:
+        if state.last_ambiguous_moves.count([self.end_row, self.end_col, piece_notation_amb]) >= 2:
             ambiguous = True
             if piece_moved == "N" or piece_moved == "R":
                 for row in range(0, 7):
-                    if self.state.board[row][self.start_col][1] == piece_moved and\
-                            self.state.board[row][self.start_col][0] == enemy:
+                    if state.board[row][self.start_col][1] == piece_moved and\
+                            state.board[row][self.start_col][0] == enemy:
                         count_col += 1
             if count_col == 1 and piece_moved == "N":
                 knight_special_case = k.rows_to_ranks[self.start_row]
             if count_col == 2 and piece_moved == "R":
                 rook_special_case = k.rows_to_ranks[self.start_row]
 
-        self.state.undo_flag = False
+        state.undo_flag = False
 
         if self.en_passant_move:
             move_string += k.get_file_rank_notation(self.start_row, self.start_col)[0] + "x" +\
@@ -880,9 +1402,12 @@ class Move:
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.id == other.id
+            return self.move_id == other.move_id
         return False
 
+    def __hash__(self):
+        return self.move_id
+
 
 class CastleFlags:
     """Castling rights information
@@ -0,0 +1,156 @@
+import argparse
+import time
+import chess_bitboard
+import chess_constants as k
+
+"""Perft (performance test) for the GameState move generator
+   Counts the leaf nodes of the legal move tree and compares them
+   with known results (run from the project folder, for example:
+   python chess_perft.py --fen "<FEN>" --depth 3 --divide)
+"""
+
+# The engine always promotes to a queen, so the counts below ignore under-promotions.
+# They match the published perft results except for Position 4 and Position 5
+# (published: 6 / 264 / 9467 and 44 / 1486 / 62379).
+perft_positions = [
+    ("Start Position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862]),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 228, 8087]),
+    ("Position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [41, 1373, 54007]),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890]),
+]
+
+
+def get_move_notation(move):
+    """Returns the move in coordinate
+       notation (e.g. e2e4)
+
+       Keyword arguments:
+       move -- Move object
+    """
+    return k.get_file_rank_notation(move.start_row, move.start_col) + \
+        k.get_file_rank_notation(move.end_row, move.end_col)
+
+
+def perft(state, depth):
+    """Returns the number of leaf nodes
+       of the legal move tree
+
+       Keyword arguments:
+       state -- information about chess game
+       depth -- number of plies
+    """
+    if depth == 1:
+        # leaf nodes only need the number of moves, not the Move objects
+        return state.count_valid_moves()
+
+    nodes = 0
+    for move in state.get_valid_moves():
+        state.make_move(move, search_mode=True)
+        nodes += perft(state, depth - 1)
+        state.undo_move()
+    return nodes
+
+
+def divide(state, depth):
+    """Returns the perft count of
+       every root move (useful for
+       finding move generation bugs)
+
+       Keyword arguments:
+       state -- information about chess game
+       depth -- number of plies (root move included)
+    """
+    root_counts = {}
+    for move in state.get_valid_moves():
+        state.make_move(move, search_mode=True)
+        root_counts[get_move_notation(move)] = perft(state, depth - 1) if depth > 1 else 1
+        state.undo_move()
+    return root_counts
+
+
+def run_perft(fen, depth, show_divide, backend):
+    """Prints the perft result (and
+       nodes per second) of a position
+
+       Keyword arguments:
+       fen         -- Forsyth-Edwards Notation of the position
+       depth       -- number of plies
+       show_divide -- True to print the count of every root move
+       backend     -- board representation (key of chess_bitboard.game_state_backends)
+    """
+    state = chess_bitboard.game_state_backends[backend].from_fen(fen)
+    start = time.perf_counter()
+    if show_divide:
+        root_counts = divide(state, depth)
+        for notation in sorted(root_counts):
+            print(f"{notation}: {root_counts[notation]}")
+        nodes = sum(root_counts.values())
+    else:
+        nodes = perft(state, depth)
+    elapsed = time.perf_counter() - start
+    print(f"{backend:<8} | perft({depth}) = {nodes} | {elapsed:.2f} s | {nodes / elapsed:.0f} nodes/s")
+    return nodes
+
+
+def run_perft_suite(max_depth, backend):
+    """Checks the move generator against
+       the perft_positions table and reports
+       the overall nodes per second
+
+       Keyword arguments:
+       max_depth -- deepest perft checked for every position
+       backend   -- board representation (key of chess_bitboard.game_state_backends)
+    """
+    passed = True
+    total_nodes = 0
+    total_time = 0
+    for name, fen, expected_counts in perft_positions:
+        for depth in range(1, min(max_depth, len(expected_counts)) + 1):
+            state = chess_bitboard.game_state_backends[backend].from_fen(fen)
+            start = time.perf_counter()
+            nodes = perft(state, depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            expected = expected_counts[depth - 1]
+            result = "OK" if nodes == expected else f"FAILED (expected {expected})"
+            passed = passed and nodes == expected
+            print(f"{backend:<8} | {name:<15} | perft({depth}) = {nodes:>8} | {elapsed:7.2f} s | "
+                  f"{nodes / elapsed:9.0f} nodes/s | {result}")
+    print(f"{backend:<8} | Total: {total_nodes} nodes | {total_time:.2f} s | {total_nodes / total_time:.0f} nodes/s")
+    return passed
+
+
+def main():
+    """Runs perft on the given FEN
+       or checks the whole perft table
+    """
+    parser = argparse.ArgumentParser(description="Perft test of the chess engine move generator")
+    parser.add_argument("--fen", help="position to test (the perft_positions table is checked if missing)")
+    parser.add_argument("--depth", type=int, default=3, help="number of plies")
+    parser.add_argument("--divide", action="store_true", help="print the count of every root move")
+    parser.add_argument("--backend", choices=list(chess_bitboard.game_state_backends),
+                        help="board representation (every backend is tested if missing)")
+    args = parser.parse_args()
+
+    backends = [args.backend] if args.backend is not None else list(chess_bitboard.game_state_backends)
+    passed = True
+    for backend in backends:
+        if args.fen is not None:
+            run_perft(args.fen, args.depth, args.divide, backend)
+        else:
+            passed = run_perft_suite(args.depth, backend) and passed
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
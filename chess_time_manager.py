@@ -0,0 +1,97 @@
+import time
+import chess_constants as k
+
+"""Time manager of the iterative deepening search
+   The search time is either a fixed budget (the
+   negamax_pruning_id_t_* modes) or allocated from
+   the game clock of the engine (base + increment)
+"""
+
+
+class TimeManager:
+    """Keeps the game clock of both players and
+       the limits of the current search: no new
+       iteration starts after the soft limit and
+       the search is interrupted at the hard limit
+    """
+    def __init__(self, base=k.clock_base, increment=k.clock_increment):
+        self.remaining = {True: base, False: base}
+        self.increment = increment
+        self.clock_used = False
+        self.start = 0
+        self.soft_limit = 0
+        self.hard_limit = 0
+        self.iteration_start = 0
+        self.last_iteration_time = 0
+        self.previous_iteration_time = 0
+
+    def start_search(self, white_moves, timeout=0):
+        """Sets the limits of a new search
+
+           Keyword arguments:
+           white_moves -- True if the engine plays white
+           timeout     -- fixed search time (s), the game clock is used if 0
+        """
+        self.start = time.time()
+        self.last_iteration_time = 0
+        self.previous_iteration_time = 0
+        self.clock_used = not timeout
+        if timeout:
+            self.soft_limit = self.hard_limit = timeout
+        else:
+            remaining = self.remaining[white_moves]
+            allocated = remaining / k.moves_to_go + self.increment
+            # a single move never takes most of the clock
+            self.soft_limit = min(allocated, remaining * k.max_time_ratio)
+            self.hard_limit = min(allocated * k.hard_time_ratio, remaining * k.max_time_ratio)
+
+    def stop_search(self, white_moves):
+        """Charges the search time to the clock
+           of the engine (the increment is added)
+
+           Keyword arguments:
+           white_moves -- True if the engine plays white
+        """
+        if self.clock_used:
+            self.remaining[white_moves] += self.increment - self.elapsed()
+
+    def elapsed(self):
+        """Returns the time since the start of the search (s)
+        """
+        return time.time() - self.start
+
+    def hard_limit_reached(self):
+        """Return true if the search has to be
+           interrupted
+        """
+        return self.elapsed() > self.hard_limit
+
+    def start_iteration(self):
+        """Return true if the next iteration can start:
+           the soft limit isn't reached and it is
+           expected to end before the hard limit (the
+           time of an iteration grows by a roughly
+           constant factor, but alternates between
+           odd and even depths)
+        """
+        elapsed = self.elapsed()
+        if elapsed > self.soft_limit:
+            return False
+        expected_time = max(self.last_iteration_time, self.previous_iteration_time) * k.iteration_time_growth
+        if elapsed + expected_time > self.hard_limit:
+            return False
+        self.iteration_start = elapsed
+        return True
+
+    def end_iteration(self, best_move_changed):
+        """Records the time of the completed iteration,
+           the soft limit is extended if it changed
+           the best move (the position is unclear)
+
+           Keyword arguments:
+           best_move_changed -- True if the best move differs from the previous iteration
+        """
+        self.previous_iteration_time = self.last_iteration_time
+        self.last_iteration_time = self.elapsed() - self.iteration_start
+        if best_move_changed:
+            self.soft_limit = min(self.soft_limit * k.best_move_change_ratio, self.hard_limit)
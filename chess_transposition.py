@@ -0,0 +1,116 @@
+import struct
+import chess_constants as k
+
+"""Transposition table of the negamax searches
+   A fixed size bytearray of buckets (two packed entries each)
+   indexed by the Zobrist key of the position, so the memory
+   used doesn't grow during the game
+   The buffer may also be shared by the worker processes of
+   the Lazy SMP search (no locks: the key is stored xor the
+   entry data, so an entry torn by two concurrent writes
+   doesn't match any position)
+"""
+
+# key, score, depth, bound, age, move id (0 if there's no best move)
+entry_struct = struct.Struct("<QdBBBH")
+bucket_size = 2 * entry_struct.size
+
+
+def get_table_size(size_mb):
+    """Returns the size in bytes of a table
+       of whole buckets
+
+       Keyword arguments:
+       size_mb -- memory of the table (MB)
+    """
+    return max(1, int(size_mb * 1024 * 1024) // bucket_size) * bucket_size
+
+
+def get_checksum(score, depth, bound, move_id):
+    """Returns the 64 bit value the key of
+       an entry is stored xor with
+
+       Keyword arguments:
+       score   -- score of the search (from the side to move)
+       depth   -- depth of the search
+       bound   -- k.EXACT, k.LOWER_BOUND or k.UPPER_BOUND
+       move_id -- id of the best move (0 if there's none)
+    """
+    return hash((score, depth, bound, move_id)) & 0xFFFFFFFFFFFFFFFF
+
+
+class TranspositionTable:
+    """Stores the searched positions in buckets
+       of a depth-preferred entry (kept while a
+       shallower search of another position
+       comes along) and an always-replace entry
+       (in the given shared memory buffer, else in
+       a new bytearray of size_mb)
+    """
+    def __init__(self, size_mb=k.transposition_table_mb, buffer=None):
+        self.table = bytearray(get_table_size(size_mb)) if buffer is None else buffer
+        self.bucket_count = len(self.table) // bucket_size
+        self.age = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def new_search(self):
+        """Resets the counters and ages the stored
+           entries (the depth-preferred entries of
+           older searches can be replaced)
+        """
+        self.age = (self.age + 1) % 256
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        """Returns (depth, score, bound, move id)
+           of the position (None if not stored)
+
+           Keyword arguments:
+           key -- Zobrist key of the position
+        """
+        offset = key % self.bucket_count * bucket_size
+        for entry_offset in (offset, offset + entry_struct.size):
+            entry_key, score, depth, bound, age, move_id = self.unpack_entry(entry_offset)
+            if entry_key == key:
+                self.hits += 1
+                return depth, score, bound, move_id
+        return None
+
+    def store(self, key, depth, score, bound, move_id):
+        """Stores the search result of the position
+           (a collision is counted if the entry of
+           another position is overwritten)
+
+           Keyword arguments:
+           key     -- Zobrist key of the position
+           depth   -- depth of the search
+           score   -- score of the search (from the side to move)
+           bound   -- k.EXACT, k.LOWER_BOUND or k.UPPER_BOUND
+           move_id -- id of the best move (0 if there's none)
+        """
+        offset = key % self.bucket_count * bucket_size
+        entry_key, _, entry_depth, _, entry_age, _ = self.unpack_entry(offset)
+        if entry_key != key and entry_age == self.age and depth < entry_depth:
+            offset += entry_struct.size
+            entry_key = self.unpack_entry(offset)[0]
+        if entry_key != key and entry_key != 0:
+            self.collisions += 1
+        entry_struct.pack_into(self.table, offset, key ^ get_checksum(score, depth, bound, move_id),
+                               score, depth, bound, self.age, move_id)
+        self.stores += 1
+
+    def unpack_entry(self, offset):
+        """Returns (key, score, depth, bound, age,
+           move id) of the entry (key 0 if empty)
+
+           Keyword arguments:
+           offset -- position of the entry in the table
+        """
+        entry_key, score, depth, bound, age, move_id = entry_struct.unpack_from(self.table, offset)
+        if entry_key != 0:
+            entry_key ^= get_checksum(score, depth, bound, move_id)
+        return entry_key, score, depth, bound, age, move_id
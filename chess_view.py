@@ -116,6 +116,18 @@ class View:
                                             k.customizer_offset_y + row * k.SQ_SIZE_C,
                                             k.SQ_SIZE_C, k.SQ_SIZE_C))
 
+    @staticmethod
+    def get_view_square(row, col):
+        """Maps a board square to the square drawn
+           on the screen and back (the board is
+           turned around when it is flipped)
+
+           Keyword arguments:
+           row -- (0-7)
+           col -- (0-7)
+        """
+        return (7 - row, 7 - col) if k.flip else (row, col)
+
     def draw_pieces(self, screen, board):
         """Checks game state and updates
            the current board (can also set coordinates
@@ -127,20 +139,21 @@ class View:
         """
         for row in range(k.DIMENSION):
             for col in range(k.DIMENSION):
+                board_row, board_col = self.get_view_square(row, col)
                 if row == 7 and k.coordinates:
-                    text_object = k.text_font_end_message.render(k.cols_to_files[col], True, k.text_color)
+                    text_object = k.text_font_end_message.render(k.cols_to_files[board_col], True, k.text_color)
                     self.screen.blit(text_object,
                                      p.Rect(col * k.SQUARE_SIZE + k.coordinates_x,
                                             row * k.SQUARE_SIZE + k.coordinates_y,
                                             k.SQUARE_SIZE, k.SQUARE_SIZE))
 
                 if col == 0 and k.coordinates:
-                    text_object = k.text_font_end_message.render(k.rows_to_ranks[row], True, k.text_color)
+                    text_object = k.text_font_end_message.render(k.rows_to_ranks[board_row], True, k.text_color)
                     self.screen.blit(text_object,
                                      p.Rect(col * k.SQUARE_SIZE,
                                             row * k.SQUARE_SIZE + k.coordinates_y,
                                             k.SQUARE_SIZE, k.SQUARE_SIZE))
-                piece = board[row][col]
+                piece = board[board_row][board_col]
                 if piece != k.empty:
                     screen.blit(self.IMAGES[piece],
                                 p.Rect(col * k.SQUARE_SIZE,
@@ -545,7 +558,7 @@ class View:
                             self.classifier_ai_vs_black_handler(controller)
                             self.classifier_ai_vs_ai_handler(controller)
                             self.flip_handler(classifier)
-                        controller.model.board = classifier.predicted_board
+                        controller.model.board = [list(row) for row in classifier.predicted_board]
                 else:
                     if classifier.imported_image != 0:
                         self.draw_classifier_info()